@@ -0,0 +1,75 @@
+import queue
+import time
+import atexit
+import logging
+import logging.handlers
+
+
+# 异步日志：扫描线程只把日志放入队列，由后台线程统一写入文件
+# 写入时不逐条 flush，累计一定条数或超过一定时间后再 flush（ERROR 及以上立即 flush）
+
+
+# 批量 flush 的文件日志处理器
+class BatchFileHandler(logging.FileHandler):
+    def __init__(self, filename, batch_size=500, flush_interval=1.0):
+        super().__init__(filename, encoding='utf-8')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            if self.pending >= self.batch_size or record.levelno >= logging.ERROR or \
+                    time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+
+# 后台写日志的线程，stop() 会写完队列中剩余的日志并关闭文件（可以重复调用）
+class AsyncLog:
+    def __init__(self, listener, handlers):
+        self.listener = listener
+        self.handlers = handlers
+        self.stopped = False
+
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+# 启动异步日志
+# 参数 files：{记录器名称: 文件路径}，名称为 None 的文件记录所有日志（包括其他记录器的日志）
+# 所有记录器的日志都经过根记录器上的队列，由一个后台线程按记录器名称分发到各个文件
+def start_async_log(files, level=logging.INFO):
+    log_queue = queue.SimpleQueue()
+    handlers = []
+    for name, path in files.items():
+        handler = BatchFileHandler(path)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        if name is not None:
+            handler.addFilter(logging.Filter(name))
+        handlers.append(handler)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+
+    async_log = AsyncLog(listener, handlers)
+    # 异常退出（比如配置错误时 exit()）时，也写完剩余的日志
+    atexit.register(async_log.stop)
+    return async_log
@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import time
+import yaml
+import random
+import shutil
+import argparse
+import platform
+import subprocess
+import statistics
+from gittool import GitTool
+from gitlab_stub import start_stub_server
+from run_metrics import dir_size
+
+
+# 性能测试：生成合成的 git 仓库，通过本地 GitLab 替身（gitlab_stub.py）和 file:// 地址提供，不需要网络
+# 分别测试各阶段（clone、获取文件列表、查询文件）以及端到端（python main.py）的耗时和吞吐量，结果输出为 json
+#
+# 运行：python benchmark.py --projects 3 --files 500 --file-size 4096 --branches 3 --hit-density 0.05
+# 相同的参数（包括 --seed）生成的仓库内容完全相同，结果可以在不同版本之间对比
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# 被搜索的字符串
+NEEDLE = '/api/v1/bench_orders'
+# 合成仓库的提交时间固定，保证生成的提交ID不变
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_AUTHOR_DATE": "2024-01-01T00:00:00+00:00",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_DATE": "2024-01-01T00:00:00+00:00",
+}
+ENGINES = ['python', 'mmap', 'go']
+SCAN_MODES = ['checkout', 'object']
+CLONE_STRATEGIES = ['full', 'shallow', 'sparse']
+
+
+def _git(path, *args):
+    env = dict(os.environ, **GIT_ENV)
+    return subprocess.run(['git', '-C', path] + list(args), capture_output=True, text=True, check=True,
+                          env=env).stdout
+
+
+# 生成一个文件的内容：若干行伪代码，hit 为 True 时在随机的一行插入被搜索的字符串
+def _make_content(rng, file_size, hit):
+    lines = []
+    size = 0
+    while size < file_size:
+        line = f"const v{rng.randrange(100000)} = compute({rng.randrange(1000)}, '{rng.randrange(10 ** 8):08x}');"
+        lines.append(line)
+        size += len(line) + 1
+    if hit:
+        lines.insert(rng.randrange(len(lines) + 1), f"fetch('{NEEDLE}')")
+    return '\n'.join(lines) + '\n'
+
+
+# 生成一个合成仓库：main 分支 + (branches - 1) 个分支，每个分支修改约 5% 的文件
+# 80% 的文件为 .js（被查询），20% 为 .css（被文件匹配规则过滤）
+def make_repo(path, rng, files, file_size, branches, hit_density):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    _git(path, 'init', '-q', '-b', 'main')
+    file_paths = []
+    for i in range(files):
+        ext = '.css' if i % 5 == 4 else '.js'
+        file_path = f"src/m{i % 20}/d{i % 7}/f{i}{ext}"
+        file_paths.append(file_path)
+        os.makedirs(os.path.join(path, os.path.dirname(file_path)), exist_ok=True)
+        with open(os.path.join(path, file_path), 'w') as file:
+            file.write(_make_content(rng, file_size, rng.random() < hit_density))
+    _git(path, 'add', '-A')
+    _git(path, 'commit', '-q', '-m', 'init')
+
+    for b in range(1, branches):
+        _git(path, 'checkout', '-q', '-b', f"branch-{b}", 'main')
+        for file_path in rng.sample(file_paths, max(1, files // 20)):
+            with open(os.path.join(path, file_path), 'a') as file:
+                file.write(_make_content(rng, 256, rng.random() < hit_density))
+        _git(path, 'commit', '-q', '-a', '-m', f"change {b}")
+    _git(path, 'checkout', '-q', 'main')
+
+
+# 生成所有仓库，返回替身服务的数据
+def make_repos(work_dir, args):
+    rng = random.Random(args.seed)
+    projects = []
+    for i in range(args.projects):
+        path = os.path.join(work_dir, 'repos', f"project{i}")
+        make_repo(path, rng, args.files, args.file_size, args.branches, args.hit_density)
+        projects.append({"id": i + 1, "name": f"project{i}", "path_with_namespace": f"bench/project{i}",
+                         "group_id": 1, "path": path})
+    return {"groups": [{"id": 1, "name": "bench", "parent_id": None}], "projects": projects}
+
+
+# 在仓库自带的 config.yml 基础上生成测试用的配置
+def make_config(api_url, work_dir, overrides):
+    with open(os.path.join(BENCH_DIR, 'config.yml')) as file:
+        config = yaml.safe_load(file)
+    config.update({
+        "model": 'group',
+        "gitlab_api_url": api_url,
+        "string_to_search": NEEDLE,
+        "string_to_search_file": '',
+        "test_mode": False,
+        "output": {"formats": ['xlsx']},
+        "mirror": {"enable": True, "path": os.path.join(work_dir, 'mirror')},
+        # 缓存、增量查询、预过滤会影响对比，全部关闭
+        "match_cache": {"enable": False, "path": os.path.join(work_dir, 'cache.db'), "max_entries": 1000000},
+        "incremental": {"enable": False, "path": os.path.join(work_dir, 'incremental')},
+        "prefilter": {"enable": False, "per_ref": False, "mode": 'verify', "index_lag_hours": 24},
+        "file_match": {"type": 'ext', "file_type": ['.js']},
+        "branch": {"branch_match_type": 'all', "branch_match_name": '', "branch_limit": 'all',
+                   "commit_since_before": 15},
+        "type_group": {"group_id": 1, "project_match_type": 'all', "project_match_str": ''},
+    })
+    config.update(overrides)
+    return config
+
+
+def _write_config(run_dir, config):
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, 'config.yml'), 'w') as file:
+        yaml.safe_dump(config, file, allow_unicode=True)
+
+
+def _timed(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+
+def _go_available():
+    return os.path.exists(os.path.join(BENCH_DIR, 'lib', 'search.so'))
+
+
+# 各阶段的耗时：使用第一个项目的 main 分支，直接调用 GitTool 的各阶段方法
+def bench_stages(work_dir, api_url, data, args):
+    results = []
+    run_dir = os.path.join(work_dir, 'stage')
+    _write_config(run_dir, make_config(api_url, work_dir, {}))
+    old_cwd = os.getcwd()
+    os.chdir(run_dir)
+    try:
+        gt = GitTool()
+        gt._read_config()
+        source = 'file://' + data['projects'][0]['path']
+
+        # clone
+        for strategy in CLONE_STRATEGIES:
+            gt.config['clone']['strategy'] = strategy
+            dest = os.path.join(run_dir, 'clone')
+
+            def clone():
+                shutil.rmtree(dest, ignore_errors=True)
+                gt._clone_branch(source, dest, 'main')
+            best, median, _ = _timed(clone, args.repeat)
+            results.append({"stage": 'clone', "variant": strategy, "seconds": best, "median_seconds": median,
+                            "disk_bytes": dir_size(dest)})
+
+        # 获取文件列表
+        checkout = os.path.join(run_dir, 'checkout')
+        shutil.rmtree(checkout, ignore_errors=True)
+        gt.config['clone']['strategy'] = 'full'
+        gt._clone_branch(source, checkout, 'main')
+        best, median, files = _timed(lambda: gt.find_files_by_match_name(checkout), args.repeat)
+        results.append({"stage": 'list_files', "variant": 'walk', "seconds": best, "median_seconds": median,
+                        "files": len(files), "files_per_second": len(files) / best})
+        best, median, indexed = _timed(lambda: gt.find_files_by_git_index(checkout), args.repeat)
+        results.append({"stage": 'list_files', "variant": 'index', "seconds": best, "median_seconds": median,
+                        "files": len(indexed), "files_per_second": len(indexed) / best})
+        unit = {"path": os.path.join(checkout, '.git'), "branch": 'main'}
+        best, median, _ = _timed(lambda: gt._read_branch_tree(unit), args.repeat)
+        results.append({"stage": 'list_files', "variant": 'object', "seconds": best, "median_seconds": median,
+                        "files": len(unit['files']), "files_per_second": len(unit['files']) / best})
+
+        # 查询文件内容（单进程）
+        total_bytes = sum(os.path.getsize(os.path.join(checkout, file_path)) for file_path, _ in indexed)
+        for scan_mode in SCAN_MODES:
+            for engine in ENGINES:
+                if engine == 'go' and (scan_mode == 'object' or not _go_available()):
+                    continue
+                gt.config['file_search_engine'] = engine
+                task = {"scan_mode": scan_mode,
+                        "path": checkout if scan_mode == 'checkout' else unit['path'],
+                        "files": indexed}
+                best, median, searched = _timed(lambda: gt.search_files(task), args.repeat)
+                matched = sum(len(result['MatchedLines'] or []) for _, result in searched)
+                results.append({"stage": 'search', "variant": f"{scan_mode}/{engine}", "seconds": best,
+                                "median_seconds": median, "bytes": total_bytes, "matched_lines": matched,
+                                "mb_per_second": total_bytes / best / 1024 / 1024})
+    finally:
+        os.chdir(old_cwd)
+    return results
+
+
+# 端到端耗时：每种 引擎 x 扫描模式 在独立目录中运行 python main.py
+def bench_end_to_end(work_dir, api_url, args):
+    results = []
+    # 预热：创建本地镜像，之后的每次运行都只做增量 fetch
+    warm_dir = os.path.join(work_dir, 'e2e', 'warmup')
+    _write_config(warm_dir, make_config(api_url, work_dir, {}))
+    _run_main(warm_dir)
+
+    for scan_mode in SCAN_MODES:
+        for engine in ENGINES:
+            if engine == 'go' and not _go_available():
+                results.append({"engine": engine, "scan_mode": scan_mode, "skipped": '未编译 lib/search.so'})
+                continue
+            run_dir = os.path.join(work_dir, 'e2e', f"{scan_mode}-{engine}")
+            _write_config(run_dir, make_config(api_url, work_dir, {"file_search_engine": engine,
+                                                                   "scan_mode": scan_mode}))
+            best, median, returncode = _timed(lambda: _run_main(run_dir), args.repeat)
+            with open(os.path.join(run_dir, 'log', 'match.log'), encoding='utf-8') as file:
+                matched = sum(1 for _ in file)
+            results.append({"engine": engine, "scan_mode": scan_mode, "seconds": best, "median_seconds": median,
+                            "returncode": returncode, "matched_lines": matched})
+    return results
+
+
+def _run_main(run_dir):
+    with open(os.path.join(run_dir, 'stdout.txt'), 'w') as stdout:
+        return subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'main.py')], cwd=run_dir,
+                              stdout=stdout, stderr=subprocess.STDOUT).returncode
+
+
+def _environment():
+    git_version = subprocess.run(['git', '--version'], capture_output=True, text=True).stdout.strip()
+    tool_commit = subprocess.run(['git', '-C', BENCH_DIR, 'rev-parse', 'HEAD'], capture_output=True,
+                                 text=True).stdout.strip()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git": git_version,
+        "tool_commit": tool_commit,
+        "time": time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='git-tools 性能测试（合成仓库 + 本地 GitLab 替身，不需要网络）')
+    parser.add_argument('--projects', type=int, default=3, help='项目数')
+    parser.add_argument('--files', type=int, default=500, help='每个项目的文件数')
+    parser.add_argument('--file-size', type=int, default=4096, help='每个文件的大小（字节）')
+    parser.add_argument('--branches', type=int, default=3, help='每个项目的分支数（包括 main）')
+    parser.add_argument('--hit-density', type=float, default=0.05, help='包含被搜索字符串的文件比例')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--repeat', type=int, default=1, help='每项测试的重复次数（结果取最小值和中位数）')
+    parser.add_argument('--skip-e2e', action='store_true', help='只测试各阶段，不测试端到端')
+    parser.add_argument('--work-dir', default='./bench_work', help='工作目录（合成仓库、镜像、每次运行的日志）')
+    parser.add_argument('--output', default='benchmark_result.json', help='结果文件（json）')
+    args = parser.parse_args()
+
+    work_dir = os.path.abspath(args.work_dir)
+    print(f"正在生成合成仓库：{work_dir}")
+    stub_data = make_repos(work_dir, args)
+    server = start_stub_server(stub_data)
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        report = {
+            "environment": _environment(),
+            "parameters": vars(args),
+            "stages": bench_stages(work_dir, stub_url, stub_data, args),
+            "end_to_end": [] if args.skip_e2e else bench_end_to_end(work_dir, stub_url, args),
+            "api_requests": server.RequestHandlerClass.stub.request_counts,
+        }
+    finally:
+        server.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    for item in report['stages']:
+        print(f"{item['stage']:<12}{item['variant']:<20}{item['seconds']:.4f} 秒")
+    for item in report['end_to_end']:
+        if 'skipped' in item:
+            print(f"{'end_to_end':<12}{item['scan_mode'] + '/' + item['engine']:<20}跳过：{item['skipped']}")
+        else:
+            print(f"{'end_to_end':<12}{item['scan_mode'] + '/' + item['engine']:<20}{item['seconds']:.4f} 秒，"
+                  f"匹配 {item['matched_lines']} 行")
+    print(f"结果已写入：{args.output}")
@@ -0,0 +1,79 @@
+import re
+import fnmatch
+
+
+# .gitattributes 中与查询相关的标记
+# 只处理 binary / -text（二进制文件）、linguist-generated（生成的文件）、linguist-vendored（第三方代码）
+# 规则按顺序匹配，后面的规则覆盖前面的规则（与 git 一致）；以 / 结尾的规则在 git 中不匹配文件，忽略
+class GitAttributes:
+    def __init__(self, text):
+        # [(匹配函数, {属性: 是否设置})]
+        self.rules = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line == '' or line.startswith('#') or line.startswith('[attr]'):
+                continue
+            parts = line.split()
+            pattern = parts[0].strip('"')
+            if pattern.endswith('/'):
+                continue
+            attrs = {}
+            for attr in parts[1:]:
+                name, value = _parse_attr(attr)
+                if name == 'binary':
+                    attrs['text'] = False
+                elif name in ['text', 'linguist-generated', 'linguist-vendored']:
+                    attrs[name] = value
+            if attrs:
+                self.rules.append((_compile_pattern(pattern), attrs))
+
+    # 返回跳过该文件的原因（binary 二进制，generated 生成的文件，vendored 第三方代码），不跳过返回 None
+    def skip_reason(self, file_path):
+        attrs = {}
+        for is_matched, rule_attrs in self.rules:
+            if is_matched(file_path):
+                attrs.update(rule_attrs)
+        if attrs.get('text') is False:
+            return 'binary'
+        if attrs.get('linguist-generated') is True:
+            return 'generated'
+        if attrs.get('linguist-vendored') is True:
+            return 'vendored'
+        return None
+
+
+# 解析一个属性：name 设置，-name / !name 取消，name=true|false 按值
+def _parse_attr(attr):
+    if attr.startswith('-') or attr.startswith('!'):
+        return attr[1:], False
+    if '=' in attr:
+        name, value = attr.split('=', 1)
+        return name, value.lower() not in ['false', '0']
+    return attr, True
+
+
+# 规则中不含 / 时匹配任意层级目录下的文件名，否则从仓库根目录开始匹配完整路径（支持 **）
+def _compile_pattern(pattern):
+    if '/' not in pattern:
+        return lambda file_path: fnmatch.fnmatchcase(file_path.rsplit('/', 1)[-1], pattern)
+    regex = ''
+    i = 0
+    pattern = pattern.lstrip('/')
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    compiled = re.compile(regex + r'\Z')
+    return lambda file_path: compiled.match(file_path) is not None
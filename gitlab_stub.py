@@ -0,0 +1,223 @@
+import re
+import json
+import argparse
+import threading
+import subprocess
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 本地 GitLab 替身：模拟本工具用到的 GitLab API，数据来自本地 git 仓库
+# 仓库地址以 file:// 形式返回，因此 clone / fetch 也不需要网络，可用于本地测试和性能测试
+#
+# 数据文件（json）格式：
+# {
+#     "groups": [{"id": 1, "name": "g", "parent_id": null}],
+#     "projects": [{"id": 1, "name": "alpha", "path_with_namespace": "g/alpha", "group_id": 1, "path": "/abs/path/alpha"}]
+# }
+# 项目可以设置 "search_lag": true，模拟搜索索引滞后（代码搜索总是返回空结果）
+#
+# 启动：python gitlab_stub.py --data data.json --port 8765
+# 然后把 config.yml 中的 gitlab_api_url 配置为 http://127.0.0.1:8765
+
+
+# 执行 git 命令，返回标准输出
+# 输出中非 utf-8 的内容（比如 Latin-1 编码的文件）替换为 \ufffd，不因解码失败中断请求
+def _git(path, *args):
+    return subprocess.run(['git', '-C', path] + list(args), capture_output=True, encoding='utf-8', errors='replace',
+                          check=True).stdout
+
+
+class GitlabStub:
+    def __init__(self, data):
+        self.groups = {group['id']: group for group in data.get('groups', [])}
+        self.projects = {project['id']: project for project in data['projects']}
+        # 每个接口的请求次数（用于统计 API 请求数）
+        self.request_counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, route):
+        with self.lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+    # 项目对象（与 gitlab 返回的字段保持一致，只包含本工具用到的字段）
+    def project_json(self, project):
+        return {
+            "id": project['id'],
+            "name": project['name'],
+            "path_with_namespace": project['path_with_namespace'],
+            "http_url_to_repo": 'file://' + project['path'],
+            "default_branch": project.get('default_branch', 'main'),
+        }
+
+    def find_project(self, key):
+        key = urllib.parse.unquote(key)
+        for project in self.projects.values():
+            if str(project['id']) == key or project['path_with_namespace'] == key:
+                return project
+        return None
+
+    # 群组及其所有子群组的ID
+    def subgroup_ids(self, group_id):
+        ids = [group_id]
+        for group in self.groups.values():
+            if group.get('parent_id') == group_id:
+                ids.extend(self.subgroup_ids(group['id']))
+        return ids
+
+    def group_projects(self, group_id, include_subgroups):
+        group_ids = self.subgroup_ids(group_id) if include_subgroups else [group_id]
+        return [self.project_json(p) for p in self.projects.values() if p.get('group_id', group_id) in group_ids]
+
+    # 分支列表，包含分支最新提交的ID和提交时间
+    def branches(self, project):
+        output = _git(project['path'], 'for-each-ref',
+                      '--format=%(refname:short)%00%(objectname)%00%(committerdate:iso-strict)', 'refs/heads')
+        branches = []
+        for line in output.splitlines():
+            name, sha, committed_date = line.split('\0')
+            branches.append({
+                "name": name,
+                "commit": {"id": sha, "committed_date": committed_date},
+            })
+        return branches
+
+    # 代码搜索（scope=blobs）：在分支（默认为默认分支）中查找包含字符串的文件，只支持 blobs
+    def search_blobs(self, project, query):
+        if project.get('search_lag') is True:
+            return []
+        ref = query.get('ref', project.get('default_branch', 'main'))
+        # -I 只跳过二进制文件，匹配的行可能不是 utf-8 编码
+        result = subprocess.run(['git', '-C', project['path'], 'grep', '-F', '-n', '-I', '-e', query['search'], ref],
+                                capture_output=True, encoding='utf-8', errors='replace')
+        blobs = []
+        for line in result.stdout.splitlines():
+            # 输出格式：分支:文件路径:行号:内容
+            file_path, line_number, data = line[len(ref) + 1:].split(':', 2)
+            blobs.append({
+                "basename": file_path.rsplit('.', 1)[0],
+                "data": data,
+                "path": file_path,
+                "filename": file_path,
+                "ref": ref,
+                "startline": int(line_number),
+                "project_id": project['id'],
+            })
+        return blobs
+
+    # 提交列表（按提交时间倒序）
+    def commits(self, project, query):
+        args = ['log', '--format=%H%x00%cI']
+        if 'since' in query:
+            args.append('--since=' + query['since'])
+        if 'until' in query:
+            args.append('--until=' + query['until'])
+        args.append(query.get('ref_name', 'HEAD'))
+        output = _git(project['path'], *args)
+        commits = []
+        for line in output.splitlines():
+            sha, committed_date = line.split('\0')
+            commits.append({"id": sha, "committed_date": committed_date})
+        return commits
+
+
+class GitlabStubHandler(BaseHTTPRequestHandler):
+    # 支持 keep-alive
+    protocol_version = 'HTTP/1.1'
+    stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, obj, headers=None, status=200):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # 分页（与 gitlab 一致：page / per_page 参数，Link 与 X-Next-Page 响应头）
+    def send_page(self, items, query):
+        page = int(query.get('page', 1))
+        per_page = int(query.get('per_page', 20))
+        total_pages = max(1, (len(items) + per_page - 1) // per_page)
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Total": str(len(items)),
+            "X-Total-Pages": str(total_pages),
+        }
+        if page < total_pages:
+            next_query = dict(query, page=page + 1, per_page=per_page)
+            next_url = f"http://{self.headers['Host']}{urllib.parse.urlparse(self.path).path}?" \
+                       f"{urllib.parse.urlencode(next_query)}"
+            headers['X-Next-Page'] = str(page + 1)
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        self.send_json(items[(page - 1) * per_page:page * per_page], headers)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        path = url.path
+
+        if path == '/__stub/stats':
+            return self.send_json(self.stub.request_counts)
+
+        m = re.match(r'^/api/v4/groups/([^/]+)$', path)
+        if m:
+            self.stub.count('group')
+            group = self.stub.groups.get(int(m.group(1)), {"id": int(m.group(1)), "name": m.group(1)})
+            return self.send_json(group)
+
+        m = re.match(r'^/api/v4/groups/([^/]+)/projects$', path)
+        if m:
+            self.stub.count('group_projects')
+            include_subgroups = query.get('include_subgroups') in ('true', 'True', '1')
+            return self.send_page(self.stub.group_projects(int(m.group(1)), include_subgroups), query)
+
+        m = re.match(r'^/api/v4/projects/([^/]+)(/.*)?$', path)
+        if m:
+            project = self.stub.find_project(m.group(1))
+            if project is None:
+                return self.send_json({"message": "404 Project Not Found"}, status=404)
+            sub_path = m.group(2) or ''
+            if sub_path == '':
+                self.stub.count('project')
+                return self.send_json(self.stub.project_json(project))
+            if sub_path == '/repository/branches':
+                self.stub.count('branches')
+                return self.send_page(self.stub.branches(project), query)
+            if sub_path == '/repository/commits':
+                self.stub.count('commits')
+                return self.send_page(self.stub.commits(project, query), query)
+            if sub_path == '/search' and query.get('scope') == 'blobs':
+                self.stub.count('search')
+                return self.send_page(self.stub.search_blobs(project, query), query)
+
+        self.send_json({"message": "404 Not Found"}, status=404)
+
+
+# 启动替身服务（后台线程），返回 server，使用完后调用 server.shutdown()
+def start_stub_server(data, host='127.0.0.1', port=0):
+    handler = type('Handler', (GitlabStubHandler,), {"stub": GitlabStub(data)})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地 GitLab API 替身')
+    parser.add_argument('--data', required=True, help='数据文件（json）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    with open(args.data) as file:
+        stub_data = json.load(file)
+    stub_handler = type('Handler', (GitlabStubHandler,), {"stub": GitlabStub(stub_data)})
+    print(f"GitLab 替身已启动：http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), stub_handler).serve_forever()
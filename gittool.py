@@ -1,46 +1,148 @@
 import os
 import gitlab
+import requests
 import logging
 import shutil
 import pathlib
 import time
 import yaml
-from openpyxl import Workbook
-from openpyxl import load_workbook
 from git import Repo
+from gitlab.v4.objects import Project
 import re
 import datetime
 import ctypes
 import json
+import mmap
+import bisect
+import codecs
+import threading
+import multiprocessing
+import types
+import zlib
+import cProfile
+import pstats
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from gitdb.util import hex_to_bin
+from match_cache import MatchCache
+from scan_state import ScanState
+from run_metrics import RunMetrics, dir_size
+from async_log import start_async_log
+from result_sink import open_sinks
+from trigram_index import TrigramIndex, extract_trigrams
+from regex_literals import required_literals
+from git_attributes import GitAttributes
+from unit_journal import UnitJournal
 
 
 class GitTool:
+    # 每个查询任务包含的文件数（大分支会被拆成多个任务，分散到多个进程）
+    SEARCH_CHUNK_SIZE = 500
+    # 文件分流时跳过文件的原因
+    SKIP_REASONS = {
+        "too_large": "过大",
+        "binary": "二进制",
+        "non_utf8": "非 utf-8 编码",
+        "generated": "生成的文件",
+        "vendored": "第三方代码",
+    }
+    # 子目录文件列表缓存的文件数上限（对象库模式，相同的子目录只遍历一次）
+    SUBTREE_CACHE_MAX_FILES = 1000000
+    # 本次运行内记录的 blob 查询结果数上限（包括已提交查询、还没有结果的），超过后新的 blob 不再去重
+    RUN_RESULTS_MAX_BLOBS = 1000000
+
     def __init__(self):
         # 配置
         self.config = None
         # gitlab api的客户端
         self.gl = None
-        self.workbook = None
-        # excel
-        self.worksheet = None
-        # 日志句柄
+        # 匹配结果输出（excel、csv、jsonl）
+        self.sinks = []
+        # 日志句柄（日志由后台线程异步写入）
+        self.async_log = None
         self.match_logger = None
         self.branch_logger = None
         self.err_logger = None
+        # 日志目录与临时目录（分片执行时每个分片使用各自的子目录）
+        self.log_dir = 'log'
+        self.temp_dir = 'tempdir'
+        # 分片执行：(分片序号, 分片总数)，未分片时为 None
+        self.shard = None
+        # 分支处理记录（units.jsonl，用于中断后继续查询、合并分片结果）
+        self.journal = None
+        # 是否继续上次中断的查询；上次已完成的分支：(项目ID, 分支名, 最新提交ID) -> 分支处理记录
+        self.resume = False
+        self.completed_units = {}
+        # 项目ID -> 项目在完整项目列表中的序号；项目ID -> 已处理的分支数
+        self.project_order = {}
+        self.branch_counts = {}
         self.search_lib = None
+        # 编译后的文件名匹配函数
+        self.file_matcher = None
+        # 多个被搜索字符串合并后的正则（字符串列表 -> 正则）
+        self.patterns_regex = {}
+        # 正则模式下编译后的正则和必须包含的字符串（(是否文本, 正则列表) -> [(正则, 编译后的正则, 必须包含的字符串)]）
+        self.search_regexes = {}
         # 时间限制
         self.commit_since_before = None
+        # 发起 gitlab api 请求的线程池（控制同时进行中的请求数）
+        self.api_pool = None
+        # 本次运行中已经 fetch 过的镜像（项目ID），同一个项目只 fetch 一次
+        self.mirror_fetched = set()
+        # 每个项目的镜像锁（项目ID -> 锁），避免多个线程同时更新同一个镜像
+        self.mirror_locks = {}
+        self.mirror_locks_lock = threading.Lock()
+        # 查询结果缓存（以 blob 对象ID 为键）
+        self.match_cache = None
+        # 增量查询的扫描记录（项目+分支 -> 上次扫描的提交ID和查询结果）
+        self.scan_state = None
+        # 运行统计（各阶段耗时、api 请求数、每个分支的统计）
+        self.metrics = None
+        # 查询时读取的字节数（查询进程中累计）
+        self.bytes_read = 0
+        # 耗时最长的分支 (耗时, (prepare, unit))，用于性能分析
+        self.slowest_branch = None
+        # 本次运行内的去重：
+        # 分支最新提交ID（来自分支列表）：(项目ID, 分支名) -> 提交ID
+        self.branch_tips = {}
+        # 已经开始处理的最新提交ID -> 第一个处理它的分支（项目名-分支名）
+        self.tips_submitted = {}
+        # 已经处理完（且没有文件查询出错）的最新提交ID -> 提交信息和有匹配的文件结果，供最新提交相同的分支直接使用
+        self.tip_results = {}
+        # 已经查询过的 blob 对象ID -> 查询结果；已提交查询、还没有结果的 blob 对象ID
+        self.run_results = {}
+        self.run_pending = set()
+        # 子目录（tree 对象ID）-> 其中符合条件的文件 [(相对子目录的路径, blob对象ID)]
+        self.subtree_files = {}
+        self.subtree_files_count = 0
+        # 多个 io 线程同时遍历分支，检查上限和写入缓存时加锁
+        self.subtree_files_lock = threading.Lock()
+        # 本次执行的操作：search 查询，index_build 建立索引，index_query 使用索引查询
+        self.action = 'search'
+        # 是否在查询进程池的进程中（go 库内部并行数按进程数分摊）
+        self.in_search_worker = False
 
     # 初始化
-    def init(self):
+    # 参数 resume：继续上次中断的查询（保留分支处理记录，跳过已完成的分支）
+    def init(self, resume=False):
+        self.resume = resume
         # 删除历史文件
         self._remove_oldfile()
         # 设置日志
         self._set_log()
-        # 启动 excel
-        self._open_excel()
         # 读取配置
         self._read_config()
+        # 打开匹配结果输出
+        self._open_sinks()
+        # 打开运行统计
+        self._open_metrics()
+        # 打开分支处理记录
+        self._open_journal()
+        # 打开查询结果缓存
+        self._open_match_cache()
+        # 打开增量查询记录
+        self._open_scan_state()
 
     # 读取配置
     def _read_config(self):
@@ -61,24 +163,200 @@ class GitTool:
                 }
             }
             config.update(branch_dict)
+        # 2. 旧配置没有 mirror 项，则不启用镜像缓存
+        if 'mirror' not in config:
+            config.update({'mirror': {'enable': False, 'path': './mirror'}})
+        # 3. 旧配置没有 scan_mode 项，则使用检出模式
+        if 'scan_mode' not in config:
+            config.update({'scan_mode': 'checkout'})
+        if 'file_list_source' not in config:
+            config.update({'file_list_source': 'walk'})
+        # 4. 旧配置没有 match_cache 项，则不启用查询结果缓存
+        if 'match_cache' not in config:
+            config.update({'match_cache': {'enable': False, 'path': './cache/match_cache.db', 'max_entries': 1000000}})
+        # 5. 旧配置没有 concurrency 项，则串行处理
+        if 'concurrency' not in config:
+            config.update({'concurrency': {'io_workers': 1, 'search_workers': 1}})
+        # 6. 旧配置没有 output 项，则只输出 excel
+        if 'output' not in config:
+            config.update({'output': {'formats': ['xlsx']}})
+        if 'api_workers' not in config['concurrency']:
+            config['concurrency']['api_workers'] = 1
+        # 7. 旧配置没有 incremental 项，则不启用增量查询
+        if 'incremental' not in config:
+            config.update({'incremental': {'enable': False, 'path': './incremental'}})
+        # 8. 旧配置没有 prefilter 项，则不启用预过滤
+        if 'prefilter' not in config:
+            config.update({'prefilter': {'enable': False, 'per_ref': False, 'mode': 'verify', 'index_lag_hours': 24}})
+        # 9. 旧配置没有 clone 项，则完整 clone
+        if 'clone' not in config:
+            config.update({'clone': {'strategy': 'full'}})
+        # 10. 旧配置没有 metrics 项，则不进行性能分析
+        if 'metrics' not in config:
+            config.update({'metrics': {'profile_slowest': False}})
+        # 11. 旧配置没有 log 项，则不输出每个文件的处理信息
+        if 'log' not in config:
+            config.update({'log': {'trace_files': False, 'progress_interval': 10}})
+        # 12. 旧配置没有 include_subgroups 项，则不包含子群组
+        if 'include_subgroups' not in config['type_group']:
+            config['type_group']['include_subgroups'] = False
+        # 13. 旧配置没有 dedupe 项，则启用运行内去重（不影响结果）
+        if 'dedupe' not in config:
+            config.update({'dedupe': {'enable': True}})
+        # 14. 旧配置没有 trigram_index 项，则使用默认的索引文件
+        if 'trigram_index' not in config:
+            config.update({'trigram_index': {'path': './index/trigram.db'}})
+        # 15. 旧配置没有 search_mode 项，则按字符串查询
+        if 'search_mode' not in config:
+            config.update({'search_mode': 'literal'})
+        # 16. 旧配置没有 triage 项，则不跳过任何文件
+        if 'triage' not in config:
+            config.update({'triage': {'enable': False, 'max_file_size': 0, 'sniff_bytes': 8192, 'gitattributes': False}})
 
         # 兼容性处理（结束）
 
+        # 被搜索的字符串：支持单个字符串、字符串列表，以及从文件读取（每行一个）
+        config['search_patterns'] = self._read_search_patterns(config)
+
         self.config = config
         # 设置 GitLab API 客户端
-        self.gl = gitlab.Gitlab(config['gitlab_api_url'], private_token=self.config['gitlab_api_access_token'])
+        self.gl = self._new_gitlab_client()
 
         # 检查配置
-        if self.config['model'] not in ['group', 'repository', 'repositories']:
-            print("model 模式错误，只能是 group 群组模式，repository 单项目模式，repositories 多项目模式")
+        if self.config['model'] not in ['group', 'repository', 'repositories', 'local']:
+            print("model 模式错误，只能是 group 群组模式，repository 单项目模式，repositories 多项目模式，local 本地模式")
+            exit()
+        if len(self.config['search_patterns']) == 0:
+            print("被搜索的字符串为空，请检查 string_to_search 或 string_to_search_file")
+            exit()
+        if self.config['file_search_engine'] not in ['python', 'go', 'mmap']:
+            print("file_search_engine 错误，只能是 python、go、mmap")
+            exit()
+        if self.config['search_mode'] not in ['literal', 'regex']:
+            print("search_mode 错误，只能是 literal 按字符串查询，regex 按正则查询")
+            exit()
+        if self.config['search_mode'] == 'regex':
+            for pattern in self.config['search_patterns']:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    print(f"被搜索的正则有误：{pattern}，{e}")
+                    exit()
+            if self.config['file_search_engine'] == 'go' and not self._go_regex_supported():
+                print("go 库版本过旧，不支持正则查询，请重新编译 lib/search.so")
+                exit()
+            # go 引擎使用 RE2 语法，不支持前后断言、反向引用等，启动时用 go 库编译一次（不查询文件）
+            if self.config['file_search_engine'] == 'go':
+                try:
+                    self.search_files_by_go_batch('.', [], self.config['search_patterns'])
+                except Exception as e:
+                    print(f"go 引擎（RE2 语法）不支持被搜索的正则，{e}。"
+                          f"请修改正则（不支持前后断言、反向引用等），或将 file_search_engine 改为 python / mmap")
+                    exit()
+        if self.config['scan_mode'] not in ['checkout', 'object']:
+            print("scan_mode 模式错误，只能是 checkout 检出模式，object 对象库模式")
+            exit()
+        if self.config['file_list_source'] not in ['walk', 'index']:
+            print("file_list_source 错误，只能是 walk 遍历目录，index 读取 git 索引")
+            exit()
+        if self.config['clone']['strategy'] not in ['full', 'shallow', 'sparse']:
+            print("clone.strategy 错误，只能是 full 完整 clone，shallow 浅克隆，sparse 浅克隆 + 稀疏检出")
+            exit()
+        if self.config['prefilter']['mode'] not in ['trust', 'verify']:
+            print("prefilter.mode 错误，只能是 trust 信任搜索结果，verify 最近有提交的分支仍然查询")
             exit()
         return config
 
+    # 整理被搜索的字符串列表（去掉空字符串和重复的字符串，保持原有顺序）
+    def _read_search_patterns(self, config):
+        patterns = config.get('string_to_search') or []
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        patterns = [str(pattern) for pattern in patterns]
+        if config.get('string_to_search_file'):
+            with open(config['string_to_search_file'], encoding='utf-8') as file:
+                patterns += [line.rstrip('\r\n') for line in file]
+        return list(dict.fromkeys(pattern for pattern in patterns if pattern != ''))
+
+    # 创建 GitLab API 客户端
+    # 使用连接池复用 keep-alive 连接，连接池大小与同时进行中的请求数一致
+    def _new_gitlab_client(self):
+        api_workers = self.config['concurrency']['api_workers']
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=api_workers, pool_maxsize=api_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.hooks['response'].append(self._count_api_request)
+        return gitlab.Gitlab(self.config['gitlab_api_url'], private_token=self.config['gitlab_api_access_token'],
+                             session=session)
+
+    # 使用 api 线程池并发执行 func(item)，按 items 的顺序返回结果
+    def _api_map(self, func, items):
+        if self.api_pool is None:
+            return [func(item) for item in items]
+        return list(self.api_pool.map(func, items))
+
+    # 打开查询结果缓存
+    def _open_match_cache(self):
+        if self.config['match_cache']['enable'] is True:
+            self.match_cache = MatchCache(self.config['match_cache']['path'],
+                                          self.config['match_cache']['max_entries'])
+
+    # 查看或清空查询结果缓存（不执行查询）
+    def manage_match_cache(self, clear=False):
+        self._read_config()
+        cache = MatchCache(self.config['match_cache']['path'], self.config['match_cache']['max_entries'])
+        if clear:
+            cache.clear()
+            print(f"查询结果缓存已清空：{cache.path}")
+        stats = cache.stats()
+        print(f"缓存文件：{stats['path']}")
+        print(f"缓存条数：{stats['entries']}（上限 {stats['max_entries']}）")
+        print(f"缓存文件大小：{stats['size_bytes']} 字节")
+        cache.close()
+
+    # 打开增量查询记录
+    def _open_scan_state(self):
+        if self.config['incremental']['enable'] is True:
+            self.scan_state = ScanState(self.config['incremental']['path'])
+
+    # 查询选项（不同选项的查询结果不能共用缓存）
+    # 不同的查询引擎对单独的 \r 换行、非 utf-8 内容的处理不同，查询引擎也作为选项
+    def _search_options(self):
+        triage = self.config['triage']
+        engine = self.config['file_search_engine']
+        # 对象库模式中，mmap 以外的引擎都使用 python 引擎查询
+        if self.config['scan_mode'] == 'object' and engine != 'mmap':
+            engine = 'python'
+        return {"mode": self.config['search_mode'], "triage": triage if triage['enable'] is True else None,
+                "engine": engine}
+
+    # 是否为正则模式
+    def _is_regex_mode(self):
+        return self.config is not None and self.config.get('search_mode') == 'regex'
+
+    # 每个被搜索的字符串（或正则）必须包含的一个字符串，用于 gitlab 代码搜索、trigram 索引等只支持字符串的预过滤
+    # 正则模式下取正则中最长的必须包含的字符串；有正则提取不出字符串时返回 None，表示无法预过滤
+    def _search_needles(self):
+        if not self._is_regex_mode():
+            return self.config['search_patterns']
+        needles = []
+        for pattern in self.config['search_patterns']:
+            literals = required_literals(pattern)
+            if not literals:
+                return None
+            needles.append(max(literals, key=len))
+        return needles
+
     # 删除历史文件
     def _remove_oldfile(self):
         # 开始前先删除文件
-        files_to_delete = ['./log/match.log', './log/branch.log', './log/err.log', './log/output.log',
-                           './log/match.xlsx']
+        files_to_delete = [os.path.join(self.log_dir, name) for name in [
+            'match.log', 'branch.log', 'err.log', 'output.log', 'match.xlsx', 'match.csv', 'match.jsonl',
+            'metrics.jsonl', 'profile_slowest.prof', 'profile_slowest.txt', 'units.jsonl', 'shard.json']]
+        # 继续上次的查询时保留分支处理记录，其他结果文件重新生成
+        if self.resume:
+            files_to_delete.remove(os.path.join(self.log_dir, 'units.jsonl'))
 
         for file in files_to_delete:
             if os.path.exists(file):
@@ -87,104 +365,200 @@ class GitTool:
             else:
                 print(f"文件 {file} 不存在，无需清理")
 
-    # 检查excel
-    def _open_excel(self):
-        # 尝试打开 Excel 文件以检查是否可以读写
+    # 打开匹配结果输出（按 output.formats 配置），结果产生时即写入磁盘
+    # 旧的结果文件已在 _remove_oldfile 中删除，这里直接新建，不需要读取旧文件
+    def _open_sinks(self):
         try:
-            self.workbook = load_workbook(filename='./log/match.xlsx')
-            self.worksheet = self.workbook.active
-            # 清空之前的内容
-            for row in self.worksheet.iter_rows(min_row=2, min_col=1):
-                for cell in row:
-                    cell.value = None
-        except FileNotFoundError:
-            self.workbook = Workbook()
-            self.worksheet = self.workbook.active
-            self.worksheet.title = "匹配结果"
-            self.worksheet.append(["仓库名", "分支名", "文件路径", "文件行数", "该行内容"])
-            self.worksheet = self.workbook.active
-        except IOError as e:
-            logging.error(f"无法打开 Excel 文件：{e}")
+            self.sinks = open_sinks(self.config['output']['formats'], self.log_dir)
+        except (IOError, ValueError) as e:
+            logging.error(f"无法打开结果文件：{e}")
+            print(f"无法打开结果文件：{e}")
             exit()
 
-        # 创建一个新的 Excel 工作簿
-        if not self.worksheet.cell(row=1, column=1).value:
-            self.worksheet.title = "匹配结果"
-            self.worksheet.append(["仓库名", "分支名", "文件路径", "文件行数"])
+    # 打开运行统计（log/metrics.jsonl）
+    def _open_metrics(self):
+        self.metrics = RunMetrics(os.path.join(self.log_dir, 'metrics.jsonl'))
+
+    # 打开分支处理记录
+    # 继续上次的查询时，读取上次已完成（没有出错）的分支；查询条件变化时，上次的记录作废，重新查询
+    def _open_journal(self):
+        path = os.path.join(self.log_dir, 'units.jsonl')
+        key = ScanState.make_key(self.config['search_patterns'], self._search_options(), self.config['file_match'])
+        if self.resume:
+            records = UnitJournal.load(path) if os.path.exists(path) else []
+            if records and records[0].get('type') == 'run' and records[0]['key'] == key:
+                for record in records[1:]:
+                    if record['error'] is None and record['tip'] is not None:
+                        self.completed_units[(record['project_id'], record['branch'], record['tip'])] = record
+                msg = f"继续上次的查询：上次已完成{len(self.completed_units)}个分支，最新提交没变的分支直接使用上次的结果"
+                logging.info(msg)
+                print(msg)
+                self.journal = UnitJournal(path, append=True)
+                return
+            msg = "没有上次的分支处理记录，或查询条件已变化，重新查询"
+            logging.info(msg)
+            print(msg)
+        self.journal = UnitJournal(path)
+        self.journal.append({"type": "run", "key": key})
+
+    # 统计一个阶段的耗时（未打开运行统计时不统计）
+    def _phase(self, name, record=None):
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.phase(name, record)
+
+    # 统计 gitlab api 请求（requests 的 response 钩子）
+    def _count_api_request(self, response, *args, **kwargs):
+        if self.metrics is not None:
+            self.metrics.add_api_request(response.request.method, response.request.path_url,
+                                         response.elapsed.total_seconds())
+
+    # 关闭匹配结果输出（excel 在这里保存）
+    def _close_sinks(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
 
     # 日志设置
+    # 所有日志先放入队列，由后台线程批量写入文件，不阻塞处理线程
+    # output.log 记录所有日志（包括 match、branch、err 三个记录器的日志）
     def _set_log(self):
-        if not os.path.exists("log"):
-            os.mkdir("log")
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
             print("日志目录已创建")
         else:
             print("日志目录已存在")
-        # 配置 output.log 记录器
-        logging.basicConfig(filename='log/output.log', level=logging.INFO, format='%(message)s')
-
-        # 创建一个新的日志记录器并配置 match.log
+        self.async_log = start_async_log({
+            None: os.path.join(self.log_dir, 'output.log'),
+            'match': os.path.join(self.log_dir, 'match.log'),
+            'branch': os.path.join(self.log_dir, 'branch.log'),
+            'err': os.path.join(self.log_dir, 'err.log'),
+        })
         self.match_logger = logging.getLogger('match')
-        match_handler = logging.FileHandler('log/match.log')
-        match_handler.setFormatter(logging.Formatter('%(message)s'))
-        self.match_logger.addHandler(match_handler)
         self.match_logger.setLevel(logging.INFO)
-
-        # 创建一个新的日志记录器并配置 branch.log
         self.branch_logger = logging.getLogger('branch')
-        branch_handler = logging.FileHandler('log/branch.log')
-        branch_handler.setFormatter(logging.Formatter('%(message)s'))
-        self.branch_logger.addHandler(branch_handler)
         self.branch_logger.setLevel(logging.INFO)
-
         self.err_logger = logging.getLogger('err')
-        err_handler = logging.FileHandler('log/err.log')
-        err_handler.setFormatter(logging.Formatter('%(message)s'))
-        self.err_logger.addHandler(err_handler)
         self.err_logger.setLevel(logging.INFO)
 
+    # 写完剩余的日志并关闭日志文件
+    def _close_log(self):
+        if self.async_log is not None:
+            self.async_log.stop()
+            self.async_log = None
+
+    # 输出每个文件的处理信息（log.trace_files 为 true 时才输出，文件很多时会明显拖慢速度）
+    def _trace_file(self, msg):
+        if self.config['log']['trace_files'] is True:
+            print(msg)
+
     # 遍历所有符合的文件，然后返回文件名
     # 入参是本地地址
     def find_files_by_match_name(self, local_repo_path, path=""):
         js_files = []
+        is_matched = self._get_file_matcher()
+
+        # 用栈代替 os.walk，目录项来自 os.scandir，相对路径直接拼接，不再逐个文件计算
+        stack = [(os.path.join(local_repo_path, path), path + '/' if path else '')]
+        while stack:
+            dir_path, rel_prefix = stack.pop()
+            with os.scandir(dir_path) as entries:
+                entries = sorted(entries, key=lambda e: e.name)
+            sub_dirs = []
+            for entry in entries:
+                # 排除 .git 目录和其他隐藏文件等
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    # 与 os.walk 一致，不进入软链接目录
+                    if not entry.is_symlink():
+                        sub_dirs.append((entry.path, rel_prefix + entry.name + '/'))
+                elif is_matched(entry.name):
+                    js_files.append(rel_prefix + entry.name)
+            # 倒序入栈，保证按目录名顺序遍历
+            stack.extend(reversed(sub_dirs))
 
-        for root, dirs, files in os.walk(os.path.join(local_repo_path, path)):
-            # 排除 .git 目录和其他隐藏文件等
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            files[:] = [f for f in files if not f.startswith('.')]
-
-            # 全文件匹配
-            if self.config['file_match']['type'] == "all":
-                for file in files:
-                    js_file_path = os.path.relpath(os.path.join(root, file), local_repo_path)
-                    js_files.append(js_file_path)
-            # 字符串匹配文件名
-            elif self.config['file_match']['type'] == "normal":
-                for file in files:
-                    # 如果这些某个文件以这个为结尾
-                    if any(type in file for type in self.config['file_match']['file_type']):
-                        js_file_path = os.path.relpath(os.path.join(root, file), local_repo_path)
-                        js_files.append(js_file_path)
-            # 后缀名匹配
-            elif self.config['file_match']['type'] == "ext":
-                for file in files:
-                    # 如果这些某个文件以这个为结尾
-                    if any(file.endswith(ext) for ext in self.config['file_match']['file_type']):
-                        js_file_path = os.path.relpath(os.path.join(root, file), local_repo_path)
-                        js_files.append(js_file_path)
-            # 正则匹配
-            elif self.config['file_match']['type'] == "regexp":
-                for file in files:
-                    # 解析字符串为正则表达式
-                    regex = re.compile(self.config['file_match']['file_type'])
-                    if len(regex.findall(file)) > 0:
-                        js_file_path = os.path.relpath(os.path.join(root, file), local_repo_path)
-                        js_files.append(js_file_path)
-            else:
-                self.err_logger.info("未选择文件匹配模式，程序退出")
-                exit()
+        return js_files
 
+    # 从 git 索引中获取所有符合的文件（不遍历磁盘），同时拿到文件的 blob 对象ID
+    # 入参是本地地址，返回 [(文件相对路径, blob对象ID)]
+    def find_files_by_git_index(self, local_repo_path):
+        js_files = []
+        is_matched = self._get_file_matcher()
+        local_repo = Repo(local_repo_path)
+        try:
+            output = local_repo.git.ls_files('-s', '-z')
+        finally:
+            local_repo.close()
+        for line in output.split('\0'):
+            if not line:
+                continue
+            info, file_path = line.split('\t', 1)
+            mode, blob_sha = info.split(' ')[:2]
+            # 只处理普通文件（跳过子模块、软链接）
+            if mode not in ('100644', '100755'):
+                continue
+            # 排除隐藏目录和隐藏文件
+            if ('/' + file_path).find('/.') != -1:
+                continue
+            if is_matched(file_path.rsplit('/', 1)[-1]):
+                js_files.append((file_path, blob_sha))
         return js_files
 
+    # 将 file_match 的规则编译成一个判断函数（入参是文件名），只编译一次
+    def _get_file_matcher(self):
+        if self.file_matcher is not None:
+            return self.file_matcher
+
+        file_types = self.config['file_match']['file_type']
+        # 全文件匹配
+        if self.config['file_match']['type'] == "all":
+            self.file_matcher = lambda file: True
+        # 字符串匹配文件名
+        elif self.config['file_match']['type'] == "normal":
+            file_types = tuple(file_types)
+            self.file_matcher = lambda file: any(type in file for type in file_types)
+        # 后缀名匹配
+        elif self.config['file_match']['type'] == "ext":
+            file_types = tuple(file_types)
+            self.file_matcher = lambda file: file.endswith(file_types)
+        # 正则匹配
+        elif self.config['file_match']['type'] == "regexp":
+            regex = re.compile(file_types)
+            self.file_matcher = lambda file: regex.search(file) is not None
+        else:
+            self.err_logger.info("未选择文件匹配模式，程序退出")
+            exit()
+        return self.file_matcher
+
+    # 遍历 git 树（不检出到磁盘）中所有符合的文件
+    # 入参是分支对应的 tree 对象，返回 [(文件相对路径, blob对象ID)]
+    # 每个子目录（tree 对象ID）的结果会缓存，多个分支中内容相同的子目录只遍历一次
+    def find_blobs_by_match_name(self, tree):
+        cached = self.subtree_files.get(tree.binsha)
+        if cached is not None:
+            return cached
+        blobs = []
+        is_matched = self._get_file_matcher()
+        for item in tree:
+            # 排除 . 开头的目录和文件，被排除的目录不会再往下遍历
+            if item.name.startswith('.'):
+                continue
+            if item.type == 'tree':
+                blobs.extend((f"{item.name}/{file_path}", blob_sha)
+                             for file_path, blob_sha in self.find_blobs_by_match_name(item))
+            # 只处理普通文件（跳过子模块、软链接）
+            elif item.type == 'blob' and item.mode != 0o120000 and is_matched(item.name):
+                blobs.append((item.name, item.hexsha))
+        if self.config['dedupe']['enable'] is True:
+            with self.subtree_files_lock:
+                # 其他线程可能已经缓存了同一个子目录，不重复计数
+                if tree.binsha not in self.subtree_files and \
+                        self.subtree_files_count + len(blobs) <= self.SUBTREE_CACHE_MAX_FILES:
+                    self.subtree_files[tree.binsha] = blobs
+                    self.subtree_files_count += len(blobs)
+        return blobs
+
     # 定义一个函数，用于在文件内容中搜索给定的【字符串】
     def search_string_in_file_by_python(self, file_path, search_string):
         res = {
@@ -196,14 +570,11 @@ class GitTool:
             with open(file_path, 'r', encoding='utf-8') as file:
                 # 处理文件内容
                 file_content = file.read()
-                for line_number, line in enumerate(file_content.split('\n')):
-                    if search_string in line:
-                        item = {
-                            "LineNumber": line_number + 1,
-                            "Line": line
-                        }
-                        res['MatchedLines'].append(item)
-                        # print("匹配成功", line)
+                res['MatchedLines'] = self._search_string_in_lines(file_content, search_string)
+        except UnicodeDecodeError as e:
+            err = f"文件不是 utf-8 编码：{file_path}，{e}"
+            res['Error'] = err
+            print(err)
         except FileNotFoundError:
             err = f"文件未找到：{file_path}"
             res['Error'] = err
@@ -221,55 +592,361 @@ class GitTool:
             #     print(res)
             return res
 
-    # 入参：文件路径，搜索字符串
+    # 在内存中的文件内容（bytes，比如从 git 对象库读出的 blob）里搜索给定的【字符串】
+    # 出参与 search_string_in_file_by_python 相同
+    def search_string_in_content_by_python(self, content, search_string, file_path=""):
+        res = {
+            "MatchedLines": [],
+            "Error": None,
+        }
+        try:
+            res['MatchedLines'] = self._search_string_in_lines(content.decode('utf-8'), search_string)
+        except UnicodeDecodeError as e:
+            err = f"文件不是 utf-8 编码：{file_path}，{e}"
+            res['Error'] = err
+            print(err)
+        return res
+
+    # 逐行匹配，返回匹配成功的行。search_string 可以是一个字符串，也可以是字符串列表
+    # 一行命中多个字符串时，每个字符串各返回一条，Pattern 为命中的字符串
+    def _search_string_in_lines(self, file_content, search_string):
+        patterns = [search_string] if isinstance(search_string, str) else search_string
+        if self._is_regex_mode():
+            return self._search_regex_in_content(file_content, patterns)
+        matched_lines = []
+        if len(patterns) == 1:
+            pattern = patterns[0]
+            for line_number, line in enumerate(file_content.split('\n')):
+                if pattern in line:
+                    item = {
+                        "LineNumber": line_number + 1,
+                        "Line": line,
+                        "Pattern": pattern,
+                    }
+                    matched_lines.append(item)
+                    # print("匹配成功", line)
+            return matched_lines
+
+        # 多个字符串：用合并后的正则在全文中只扫描一遍，找到命中的行，再确认该行命中了哪些字符串
+        regex = self._get_patterns_regex(patterns)
+        line_number = 1
+        last_line_start = 0
+        handled_line_start = -1
+        for match in regex.finditer(file_content):
+            line_start = file_content.rfind('\n', 0, match.start()) + 1
+            # 同一行有多处命中，只处理一次
+            if line_start == handled_line_start:
+                continue
+            handled_line_start = line_start
+            line_number += file_content.count('\n', last_line_start, line_start)
+            last_line_start = line_start
+            line_end = file_content.find('\n', match.start())
+            line = file_content[line_start:] if line_end == -1 else file_content[line_start:line_end]
+            for pattern in patterns:
+                if pattern in line:
+                    matched_lines.append({
+                        "LineNumber": line_number,
+                        "Line": line,
+                        "Pattern": pattern,
+                    })
+        return matched_lines
+
+    # 把多个字符串合并成一个前缀树形式的正则（相同前缀只比较一次），效果等同于多模式匹配自动机
+    # patterns 为 bytes 列表时，返回 bytes 正则（按 latin-1 逐字节构建）
+    def _get_patterns_regex(self, patterns):
+        key = tuple(patterns)
+        if key not in self.patterns_regex:
+            is_bytes = isinstance(patterns[0], bytes)
+            trie = {}
+            for pattern in patterns:
+                node = trie
+                for char in (pattern.decode('latin-1') if is_bytes else pattern):
+                    node = node.setdefault(char, {})
+                # 空字符串作为键，表示到这里是一个完整的字符串
+                node[''] = True
+            regex = self._trie_to_regex(trie)
+            self.patterns_regex[key] = re.compile(regex.encode('latin-1') if is_bytes else regex)
+        return self.patterns_regex[key]
+
+    def _trie_to_regex(self, node):
+        alternatives = []
+        chars = []
+        for char in sorted(k for k in node if k != ''):
+            child = node[char]
+            if len(child) == 1 and '' in child:
+                # 叶子节点，合并为字符集
+                chars.append(re.escape(char))
+            else:
+                alternatives.append(re.escape(char) + self._trie_to_regex(child))
+        if chars:
+            alternatives.append(chars[0] if len(chars) == 1 else '[' + ''.join(chars) + ']')
+        result = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+        # 到这里已经是一个完整的字符串，后续部分是可选的
+        if '' in node:
+            result = '(?:' + result + ')?'
+        return result
+
+    # 使用内存映射查询文件：直接在文件的原始字节中查找，不解码整个文件、不拆分所有行
+    # 出参与 search_string_in_file_by_python 相同
+    def search_string_in_file_by_mmap(self, file_path, search_string):
+        res = {
+            "MatchedLines": [],
+            "Error": None,
+        }
+        try:
+            with open(file_path, 'rb') as file:
+                # 空文件不能做内存映射
+                if os.fstat(file.fileno()).st_size == 0:
+                    return res
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    res['MatchedLines'] = self.search_string_in_bytes(buf, search_string)
+        except FileNotFoundError:
+            err = f"文件未找到：{file_path}"
+            res['Error'] = err
+            print(err)
+        except PermissionError:
+            err = f"没有权限读取文件：{file_path}"
+            res['Error'] = err
+            print(err)
+        except (IOError, ValueError) as e:
+            err = f"读取文件时发生错误：{e}"
+            res['Error'] = err
+            print(err)
+        return res
+
+    # 在字节内容（bytes 或 mmap）中查询，返回匹配成功的行
+    # 只有命中时才建立换行符位置索引，计算行号并截取该行，其余内容不做任何解码和拆分
+    def search_string_in_bytes(self, buf, search_string):
+        patterns = [search_string] if isinstance(search_string, str) else search_string
+        if self._is_regex_mode():
+            return self._search_regex_in_content(buf, patterns)
+        needles = [pattern.encode('utf-8') for pattern in patterns]
+        matched_lines = []
+        # 换行符位置索引，第一次命中时再建立
+        newline_offsets = None
+
+        if len(needles) == 1:
+            hits = self._iter_needle(buf, needles[0])
+        else:
+            hits = (match.start() for match in self._get_patterns_regex(needles).finditer(buf))
+
+        handled_line_start = -1
+        for position in hits:
+            line_start = buf.rfind(b'\n', 0, position) + 1
+            # 同一行有多处命中，只处理一次
+            if line_start == handled_line_start:
+                continue
+            handled_line_start = line_start
+            if newline_offsets is None:
+                newline_offsets = [match.start() for match in re.finditer(b'\n', buf)]
+            line_number = bisect.bisect_left(newline_offsets, line_start) + 1
+            line_end = buf.find(b'\n', position)
+            line = buf[line_start:] if line_end == -1 else buf[line_start:line_end]
+            # 与按文本读取时一致，去掉 \r\n 换行中的 \r
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            for pattern, needle in zip(patterns, needles):
+                if needle in line:
+                    matched_lines.append({
+                        "LineNumber": line_number,
+                        "Line": line.decode('utf-8', errors='replace'),
+                        "Pattern": pattern,
+                    })
+        return matched_lines
+
+    # 正则模式：逐个正则查询，返回匹配成功的行（按行号排序，同一行按正则的配置顺序），出参与按字符串查询时相同
+    # 先在整个内容中查找正则必须包含的字符串，缺少任何一个则跳过该正则；
+    # 再用其中最长的字符串定位候选行，只对包含所有必须包含的字符串的行执行完整的正则
+    # content 可以是 str、bytes 或 mmap，字节内容按行解码后再执行正则（与文本查询的结果一致）
+    def _search_regex_in_content(self, content, patterns):
+        is_text = isinstance(content, str)
+        newline = '\n' if is_text else b'\n'
+        hits = []
+        for index, (pattern, regex, literals) in enumerate(self._get_search_regexes(is_text, patterns)):
+            if any(content.find(literal) == -1 for literal in literals):
+                continue
+            anchor = max(literals, key=len) if literals else None
+            offset = 0
+            while offset <= len(content):
+                line_start = offset
+                if anchor is not None:
+                    position = content.find(anchor, offset)
+                    if position == -1:
+                        break
+                    line_start = content.rfind(newline, 0, position) + 1
+                line_end = content.find(newline, line_start)
+                line = content[line_start:] if line_end == -1 else content[line_start:line_end]
+                offset = len(content) + 1 if line_end == -1 else line_end + 1
+                if not is_text:
+                    if line.endswith(b'\r'):
+                        line = line[:-1]
+                if all(literal in line for literal in literals):
+                    text = line if is_text else line.decode('utf-8', errors='replace')
+                    if regex.search(text):
+                        hits.append((line_start, index, text, pattern))
+        if not hits:
+            return []
+
+        # 只有命中时才计算行号
+        hits.sort(key=lambda hit: hit[:2])
+        newline_offsets = [match.start() for match in re.finditer(re.escape(newline), content)]
+        return [{
+            "LineNumber": bisect.bisect_left(newline_offsets, line_start) + 1,
+            "Line": line,
+            "Pattern": pattern,
+        } for line_start, index, line, pattern in hits]
+
+    # 编译正则并提取必须包含的字符串（字节内容查询时，必须包含的字符串按 utf-8 编码）
+    def _get_search_regexes(self, is_text, patterns):
+        key = (is_text, tuple(patterns))
+        if key not in self.search_regexes:
+            self.search_regexes[key] = [
+                (pattern, re.compile(pattern),
+                 [literal if is_text else literal.encode('utf-8') for literal in required_literals(pattern)])
+                for pattern in patterns]
+        return self.search_regexes[key]
+
+    # 依次返回 needle 在 buf 中出现的位置
+    def _iter_needle(self, buf, needle):
+        position = buf.find(needle)
+        while position != -1:
+            yield position
+            position = buf.find(needle, position + 1)
+
+    # 加载 go 库（lib/search.so，优先使用当前目录下的，其次是本文件所在目录下的）
+    def _load_search_lib(self):
+        if self.search_lib is not None:
+            return self.search_lib
+        lib_path = os.path.abspath("./lib/search.so")
+        if not os.path.exists(lib_path):
+            lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib", "search.so")
+        search_lib = ctypes.CDLL(lib_path)
+        search_lib.searchStringInFileWrapper.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+        # 旧版本的 go 库没有释放函数，返回的字符串无法释放，只能按 c_char_p 读取
+        if hasattr(search_lib, 'freeCString'):
+            search_lib.searchStringInFileWrapper.restype = ctypes.c_void_p
+            search_lib.freeCString.argtypes = [ctypes.c_void_p]
+            search_lib.freeCString.restype = None
+        else:
+            search_lib.searchStringInFileWrapper.restype = ctypes.c_char_p
+        if hasattr(search_lib, 'searchFilesBatchWrapper'):
+            search_lib.searchFilesBatchWrapper.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
+            search_lib.searchFilesBatchWrapper.restype = ctypes.c_void_p
+        self.search_lib = search_lib
+        return search_lib
+
+    # go 库是否支持正则查询
+    def _go_regex_supported(self):
+        try:
+            search_lib = self._load_search_lib()
+        except OSError:
+            return False
+        return hasattr(search_lib, 'regexSearchSupported') and self._go_batch_supported()
+
+    # go 库是否支持批量查询
+    def _go_batch_supported(self):
+        search_lib = self._load_search_lib()
+        return hasattr(search_lib, 'searchFilesBatchWrapper') and hasattr(search_lib, 'freeCString')
+
+    # 读取 go 库返回的字符串并解析，然后释放
+    def _read_go_result(self, c_result):
+        result = json.loads(ctypes.string_at(c_result).decode('utf-8'))
+        if hasattr(self.search_lib, 'freeCString'):
+            self.search_lib.freeCString(c_result)
+        return result
+
+    # 入参：文件路径，搜索字符串（一个字符串，或字符串列表）
     # 出参：一个对象。
     #   result.get('Error') 为 True 表示有报错信息，通过 result['Error'] 获取报错信息
     #   result['MatchedLines'] 为匹配成功的数据，len=0说明没有任何被匹配成功
-    #   result['MatchedLines'][0] 示例结果 {'LineNumber': 353, 'Line': '仓库名-分支名-文件相对路径-行数-该行代码内容'}
+    #   result['MatchedLines'][0] 示例结果 {'LineNumber': 353, 'Line': '该行代码内容', 'Pattern': '命中的字符串'}
+    # go 库每次只查询一个字符串，多个字符串时逐个查询后按行号合并
     def search_string_in_file_by_go(self, file_path, search_string):
         # 如果没有初始化 go 库，则初始化
-        if self.search_lib is None:
-            self.search_lib = ctypes.CDLL(os.path.abspath("./lib/search.so"))
-            self.search_lib.searchStringInFileWrapper.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
-            self.search_lib.searchStringInFileWrapper.restype = ctypes.c_char_p
-        # 将字符串转义
-        c_file_path = ctypes.c_char_p(file_path.encode('utf-8'))
-        c_search_string = ctypes.c_char_p(search_string.encode('utf-8'))
-        # 调用go库
-        c_result = self.search_lib.searchStringInFileWrapper(c_file_path, c_search_string)
-        # 拉取返回结果
-        result = json.loads(ctypes.string_at(c_result).decode('utf-8'))
-        return result
+        search_lib = self._load_search_lib()
+        patterns = [search_string] if isinstance(search_string, str) else search_string
+        res = {
+            "MatchedLines": [],
+            "Error": None,
+        }
+        for index, pattern in enumerate(patterns):
+            # 将字符串转义
+            c_file_path = ctypes.c_char_p(file_path.encode('utf-8'))
+            c_search_string = ctypes.c_char_p(pattern.encode('utf-8'))
+            # 调用go库
+            c_result = search_lib.searchStringInFileWrapper(c_file_path, c_search_string)
+            # 拉取返回结果
+            result = self._read_go_result(c_result)
+            if result['Error'] is not None:
+                return result
+            for matched_line in result['MatchedLines'] or []:
+                matched_line['Pattern'] = pattern
+                res['MatchedLines'].append((matched_line['LineNumber'], index, matched_line))
+        # 按行号排序，同一行按字符串的配置顺序
+        res['MatchedLines'] = [item[2] for item in sorted(res['MatchedLines'], key=lambda item: item[:2])]
+        return res
+
+    # 使用 go 库批量查询：一次调用查询整批文件（go 库内部并行），只返回有匹配或有报错的文件
+    # 入参：根目录，文件相对路径列表，搜索字符串（一个字符串，或字符串列表）
+    # 出参：[(文件相对路径, 查询结果)]，与 files 的顺序一致
+    def search_files_by_go_batch(self, root, files, search_string):
+        search_lib = self._load_search_lib()
+        patterns = [search_string] if isinstance(search_string, str) else search_string
+        workers = self.config['concurrency']['search_workers']
+        if self.in_search_worker:
+            # 已经有 search_workers 个查询进程同时查询，每个进程内只使用分摊到的 cpu 核数，避免 goroutine 数成倍增长
+            workers = max((os.cpu_count() or 1) // (workers or os.cpu_count() or 1), 1)
+        options = {
+            "Patterns": patterns,
+            "Workers": workers,
+            "Mode": self.config['search_mode'],
+        }
+        if self._is_regex_mode():
+            # 正则中必须包含的字符串，go 库先用它们过滤文件和行
+            options['Literals'] = [required_literals(pattern) for pattern in patterns]
+        c_result = search_lib.searchFilesBatchWrapper(
+            ctypes.c_char_p(root.encode('utf-8')),
+            ctypes.c_char_p(json.dumps(files).encode('utf-8')),
+            ctypes.c_char_p(json.dumps(options).encode('utf-8')))
+        batch_results = self._read_go_result(c_result)
+
+        results = [(file_path, {"MatchedLines": [], "Error": None}) for file_path in files]
+        for batch_result in batch_results:
+            if batch_result['Index'] < 0:
+                raise Exception(f"go 库批量查询失败：{batch_result['Error']}")
+            results[batch_result['Index']] = (files[batch_result['Index']], {
+                "MatchedLines": batch_result['MatchedLines'] or [],
+                "Error": batch_result['Error'],
+            })
+        return results
 
     # 群组模式：过滤项目（将不需要处理的群组过滤掉）
+    # 返回一个生成器：分页获取群组下的项目，每获取到一页就过滤并交给后续处理，不等待全部项目列出
+    # 列表接口返回的项目信息已经足够（名称、仓库地址等），直接构造项目对象，不再逐个项目请求详情
     def _filter_projects_by_group(self):
         # 根据群组ID拿到所有项目
         if self.config['type_group']['group_id'] is None:
             self.err_logger.info("群组项目ID（type_group.group_id）为空")
-        group = self.gl.groups.get(self.config['type_group']['group_id'])
-        projects = group.projects.list(all=True)
+        group = self.gl.groups.get(self.config['type_group']['group_id'], lazy=True)
+        projects = group.projects.list(iterator=True, per_page=100,
+                                       include_subgroups=self.config['type_group']['include_subgroups'])
 
-        # 对仓库进行过滤，如果是普通模式，则遍历
-        if self.config['type_group']['project_match_type'] == 'normal':
-            l = []
-            for project in projects:
-                if self.config['type_group']['project_match_str'] in project.name:
-                    l.append(project)
-            projects = l
-        elif self.config['type_group']['project_match_type'] == 'regexp':
-            # 正则模式
-            l = []
+        regx = None
+        if self.config['type_group']['project_match_type'] == 'regexp':
             regx = re.compile(self.config['type_group']['project_match_str'])
-            for project in projects:
-                if regx.findall(project.name):
-                    l.append(project)
-            projects = l
-
-        # projects_name_log = [project.name for project in projects]
-        msg = "本次处理的项目有：", [project.name for project in projects]
-        print(msg)
-        logging.info(msg)
-        return projects
+        for project in projects:
+            # 对仓库进行过滤，如果是普通模式，则匹配项目名
+            if self.config['type_group']['project_match_type'] == 'normal':
+                if self.config['type_group']['project_match_str'] not in project.name:
+                    continue
+            elif self.config['type_group']['project_match_type'] == 'regexp':
+                # 正则模式
+                if not regx.findall(project.name):
+                    continue
+            msg = f"本次处理的项目：{project.name}"
+            print(msg)
+            logging.info(msg)
+            yield Project(self.gl.projects, project.attributes)
 
     # 过滤分支（将不需要处理的分支过滤掉）
     # 参数1：branches 指该项目下所有分支
@@ -301,29 +978,20 @@ class GitTool:
         elif self.config['branch']['branch_match_type'] == "last_commit_time":
             # 存储每个分支的最新提交时间和分支名称的元组
             branch_commits = []
+            delta = datetime.timedelta(days=self.commit_since_before)
+            start_date = datetime.datetime.now(datetime.timezone.utc) - delta
+
             # 按最后提交时间进行匹配
-            # 遍历所有分支
+            # 分支列表接口已经返回了每个分支最新提交的时间，直接使用，不再逐个分支请求提交列表
             for branch in branches:
-                # print(f"正在获取分支：{branch.name} 的最新提交")
-                delta = datetime.timedelta(days=self.commit_since_before)
-                start_date = datetime.datetime.now() - delta
-                # 使用15天前的日期和当前日期作为日期范围
-                end_date = datetime.datetime.now()
-                # 获取该分支的最新提交，限制只返回1个
-                commit_list = repo.commits.list(ref_name=branch.name, since=start_date, until=end_date, get_all=True)
-                # print(f"总计有 {len(commit_list)} 个提交")
-                if len(commit_list) == 0:
+                committed_date = self._parse_gitlab_time(branch.commit['committed_date'])
+                if committed_date < start_date:
                     msg = f"分支：{branch.name} 最近{self.commit_since_before}天，无提交，跳过"
                     print(msg)
                     self.branch_logger.info(msg)
                     continue
-                elif len(commit_list) > 20:
-                    msg = f"分支：{branch.name} 最近{self.commit_since_before}天，提交超过20次"
-                    print(msg)
-                    self.branch_logger.info(msg)
-                commit = commit_list[0]
                 # 将最新提交时间和分支名称作为一个元组添加到branch_commits列表中
-                branch_commits.append((commit.committed_date, branch.name))
+                branch_commits.append((committed_date, branch.name))
 
             # 按最近提交时间对分支进行排序，并提取排好序的分支名称。b[1] 指取 branch.name
             selected_branches = [b[1] for b in sorted(branch_commits, reverse=True)]
@@ -342,87 +1010,1127 @@ class GitTool:
                 # 则限制指定数量的分支数
                 selected_branches = selected_branches[:self.config['branch']['branch_limit']]
 
+        # 最后提交时间模式下，只对最终选中的分支检查提交是否频繁
+        if self.config['branch']['branch_match_type'] == "last_commit_time":
+            self._report_busy_branches(selected_branches, repo)
+
         return selected_branches
 
-    # 将项目clone到本地，然后进行处理（调用函数遍历项目查询字符串）
-    def _clone_and_deal(self, branch, repo):
-        logging.info(f"----- 小分割线 -----")
-        msg = f"正在处理分支：{branch}"
+    # 检查分支最近 N 天的提交是否超过20次，超过则记录到 branch.log
+    # 每个分支只请求一页（21条），不拉取全部提交
+    def _report_busy_branches(self, branch_names, repo):
+        start_date = datetime.datetime.now() - datetime.timedelta(days=self.commit_since_before)
+
+        def count_commits(branch_name):
+            return len(repo.commits.list(ref_name=branch_name, since=start_date, per_page=21, page=1,
+                                         get_all=False))
+
+        for branch_name, commit_count in zip(branch_names, self._api_map(count_commits, branch_names)):
+            if commit_count > 20:
+                msg = f"分支：{branch_name} 最近{self.commit_since_before}天，提交超过20次"
+                print(msg)
+                self.branch_logger.info(msg)
+
+    # 解析 gitlab 返回的时间（ISO 8601 格式，比如 2023-03-01T10:00:00.000+08:00）
+    def _parse_gitlab_time(self, value):
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    # 获取项目的本地镜像（每个项目一个 bare mirror，以项目ID命名）
+    # 不存在则 clone --mirror，存在则增量 fetch。返回镜像路径
+    # 多个分支并发处理时，同一个项目的镜像只会被一个线程更新
+    def _get_mirror(self, repo):
+        mirror_path = os.path.join(self.config['mirror']['path'], f"{repo.id}.git")
+        with self.mirror_locks_lock:
+            if repo.id not in self.mirror_locks:
+                self.mirror_locks[repo.id] = threading.Lock()
+            mirror_lock = self.mirror_locks[repo.id]
+
+        with mirror_lock:
+            # 本次运行已经更新过，直接使用
+            if repo.id in self.mirror_fetched:
+                return mirror_path
+
+            mirror_size = dir_size(mirror_path)
+            if os.path.exists(mirror_path):
+                mirror_repo = Repo(mirror_path)
+                # 仓库地址可能变更（比如项目被转移），以 gitlab 返回的为准
+                mirror_repo.git.remote('set-url', 'origin', repo.http_url_to_repo)
+                mirror_repo.git.fetch('origin', '--prune')
+                mirror_repo.close()
+                print(f"已增量更新镜像：{mirror_path}")
+            else:
+                # 先 clone 到临时目录再改名，避免中断后留下不完整的镜像
+                tmp_path = f"{mirror_path}.tmp"
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                Repo.clone_from(repo.http_url_to_repo, tmp_path, mirror=True)
+                os.rename(tmp_path, mirror_path)
+                print(f"已创建镜像：{mirror_path}")
+            if self.metrics is not None:
+                self.metrics.add_counter('mirror_bytes', dir_size(mirror_path) - mirror_size)
+
+            self.mirror_fetched.add(repo.id)
+        return mirror_path
+
+    # 处理多个项目。分阶段执行，各阶段之间并发：
+    #   1. 获取并过滤每个项目的分支（api 线程池）
+    #   2. clone / fetch 分支，列出待查询的文件（线程池）
+    #   3. 查询文件内容（进程池，文件按批拆分）
+    #   4. 按 项目 -> 分支 -> 文件 的原始顺序写入结果（主线程），保证输出顺序稳定
+    # 参数 need_get：为 True 时，需要先根据项目ID获取完整的项目对象（群组模式）
+    def _deal_projects(self, projects, need_get=False):
+        # 阶段1：获取分支（分片执行时只处理当前分片的项目）
+        units = self._discover_branches(self._select_shard(projects), need_get)
+
+        # 测试模式下，只打印分支，不进行具体处理
+        if self.config['test_mode'] is True and self.config['test_only_show_branch'] is True:
+            for repo, branch in units:
+                msg = f"测试模式警告：test_mode 与 test_only_show_branch 为 true，因此不处理分支：{repo.name}-{branch}"
+                logging.info(msg)
+                print(msg)
+            return
+
+        # 建立索引模式：只为分支建立索引，不查询
+        if self.action == 'index_build':
+            self._build_index(units)
+            return
+
+        # 阶段2、3、4
+        self._deal_units(units, lambda unit: self._prepare_branch(unit[1], unit[0]))
+
+    # 分片执行：按项目ID的 crc32 把项目分到 N 个分片，只返回当前分片的项目（未分片时返回全部项目）
+    # 同时记录每个项目在完整项目列表中的序号，合并分片结果时按这个顺序排列
+    def _select_shard(self, projects):
+        for index, project in enumerate(projects):
+            if self.shard is not None and zlib.crc32(str(project.id).encode('utf-8')) % self.shard[1] != self.shard[0]:
+                continue
+            self.project_order[project.id] = index
+            yield project
+
+    # 获取多个项目的分支（每个项目内部的请求再通过 api 线程池并发）
+    # 返回一个生成器，逐个产出 (项目对象, 分支名)，顺序与项目顺序一致
+    # projects 可以是生成器：项目一边列出，一边获取分支，后续的 clone、查询也随即开始
+    def _discover_branches(self, projects, need_get=False):
+        # 同时获取分支的项目数上限
+        window = self.config['concurrency']['api_workers'] * 2
+        with ThreadPoolExecutor(max_workers=self.config['concurrency']['api_workers']) as discovery_pool:
+            branch_futures = deque()
+            for project in projects:
+                branch_futures.append(discovery_pool.submit(self._get_project_branches, project, need_get))
+                # 按项目顺序产出已经获取完分支的项目
+                while branch_futures and (len(branch_futures) >= window or branch_futures[0].done()):
+                    repo, selected_branches = branch_futures.popleft().result()
+                    for branch in selected_branches:
+                        yield repo, branch
+            while branch_futures:
+                repo, selected_branches = branch_futures.popleft().result()
+                for branch in selected_branches:
+                    yield repo, branch
+
+    # 流水线处理多个分支（阶段2、3、4）
+    # 参数 prepare：在 io 线程池中执行，把 units 中的一项转换为待查询的分支（见 _prepare_branch 的返回值）
+    def _deal_units(self, units, prepare):
+        io_workers = self.config['concurrency']['io_workers']
+        search_workers = self.config['concurrency']['search_workers'] or os.cpu_count()
+        # 已开始 clone 但还未写入结果的分支数上限，避免临时目录占用过多磁盘
+        window = io_workers * 2
+
+        with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+                ProcessPoolExecutor(max_workers=search_workers,
+                                    mp_context=multiprocessing.get_context('spawn')) as search_pool:
+            unit_iter = iter(units)
+            prepared = deque()
+            searched = deque()
+            progress = {"total": len(units) if hasattr(units, '__len__') else None, "done": 0, "files": 0, "matches": 0,
+                        "start": time.monotonic(), "last_report": time.monotonic()}
+            while True:
+                # 补充 clone 任务
+                while len(prepared) + len(searched) < window:
+                    unit = next(unit_iter, None)
+                    if unit is None:
+                        break
+                    ready_unit = self._get_resumed_unit(unit) or self._get_shared_unit(unit)
+                    if ready_unit is not None:
+                        # 上次已完成，或最新提交与之前的分支相同，不需要 clone 和查询
+                        future = Future()
+                        future.set_result(ready_unit)
+                        prepared.append((future, unit))
+                    else:
+                        prepared.append((io_pool.submit(prepare, unit), unit))
+                if not prepared and not searched:
+                    break
+
+                # 最早的分支已经查询完毕，写入结果
+                if searched and all(f.done() for f in searched[0]['search_futures']):
+                    unit = searched.popleft()
+                    if 'fallback' in unit:
+                        # 重新 clone 完毕，提交查询（结果仍在原来的位置写入）
+                        source = unit['source']
+                        unit = unit['fallback'].result()
+                        unit['source'] = source
+                        self._submit_search(unit, search_pool)
+                        searched.appendleft(unit)
+                        continue
+                    if 'shared_tip' in unit and unit['shared_tip'] not in self.tip_results:
+                        # 最新提交相同的分支处理失败（或有文件查询出错），重新 clone 并查询该分支
+                        msg = f"分支 {unit['repo'].name}-{unit['branch']} 与 {self.tips_submitted[unit['shared_tip']]} " \
+                              f"的最新提交相同，但其结果不可用，重新查询该分支"
+                        logging.info(msg)
+                        print(msg)
+                        # 之后最新提交相同的分支使用该分支的结果
+                        self.tips_submitted[unit['shared_tip']] = f"{unit['repo'].name}-{unit['branch']}"
+                        future = io_pool.submit(prepare, unit['source'][1])
+                        searched.appendleft({"fallback": future, "source": unit['source'], "search_futures": [future]})
+                        continue
+                    self._deal_branch_result(unit)
+                    self._report_progress(progress, unit)
+                    continue
+                # 最早的分支已经 clone 完毕，提交查询
+                if prepared and prepared[0][0].done():
+                    future, source = prepared.popleft()
+                    unit = future.result()
+                    # 记录分支的来源，用于对耗时最长的分支进行性能分析
+                    unit['source'] = (prepare, source)
+                    self._submit_search(unit, search_pool)
+                    searched.append(unit)
+                    continue
+
+                wait_list = []
+                if prepared:
+                    wait_list.append(prepared[0][0])
+                if searched:
+                    wait_list.extend(searched[0]['search_futures'])
+                wait(wait_list, return_when=FIRST_COMPLETED)
+            self._report_progress(progress, None)
+
+    # 最新提交与之前（本次运行中）的分支相同时，返回一个直接使用其结果的分支，否则返回 None
+    # 只处理 (项目对象, 分支名) 形式的分支，且需要分支列表中有最新提交ID
+    def _get_shared_unit(self, source):
+        if self.config['dedupe']['enable'] is not True or not isinstance(source, tuple):
+            return None
+        repo, branch = source
+        tip = self.branch_tips.get((repo.id, branch))
+        if tip is None:
+            return None
+        if tip not in self.tips_submitted:
+            self.tips_submitted[tip] = f"{repo.name}-{branch}"
+            return None
+        return self._ready_unit(repo, branch, shared_tip=tip)
+
+    # 继续上次的查询时，上次已完成、且最新提交没变的分支，返回一个直接使用上次结果的分支，否则返回 None
+    def _get_resumed_unit(self, source):
+        if not self.completed_units or not isinstance(source, tuple):
+            return None
+        repo, branch = source
+        tip = self.branch_tips.get((repo.id, branch))
+        record = self.completed_units.get((str(repo.id), branch, tip))
+        if tip is None or record is None:
+            return None
+        return self._ready_unit(repo, branch, resumed=record)
+
+    # 不需要 clone 和查询、直接使用已有结果的分支
+    def _ready_unit(self, repo, branch, **extra):
+        return dict({
+            "repo": repo,
+            "branch": branch,
+            "scan_mode": self.config['scan_mode'],
+            "path": None,
+            "files": [],
+            "commit": None,
+            "cleanup": None,
+            "error": None,
+            "metrics": {},
+        }, **extra)
+
+    # 输出处理进度（每隔 log.progress_interval 秒输出一次，unit 为 None 时表示全部完成，立即输出）
+    def _report_progress(self, progress, unit):
+        now = time.monotonic()
+        if unit is not None:
+            progress['done'] += 1
+            progress['files'] += unit['metrics'].get('files', 0)
+            progress['matches'] += unit['metrics'].get('matches', 0)
+            if now - progress['last_report'] < self.config['log']['progress_interval']:
+                return
+        elif progress.get('reported') == progress['done']:
+            # 最后一个分支完成时已经输出过
+            return
+        progress['last_report'] = now
+        progress['reported'] = progress['done']
+        # 分支边获取边处理时，总数未知
+        done = progress['done'] if progress['total'] is None else f"{progress['done']}/{progress['total']}"
+        msg = f"进度：已完成 {done} 个分支，文件{progress['files']}个，" \
+              f"匹配{progress['matches']}行，已耗时 {now - progress['start']:.1f} 秒"
         logging.info(msg)
         print(msg)
-        # 测试模式下，这里直接返回，不进行具体处理
-        if self.config['test_mode'] is True and self.config['test_only_show_branch'] is True:
-            msg = f"测试模式警告：test_mode 与 test_only_show_branch 为 true，因此不处理分支，直接返回"
+
+    # 获取项目下的所有分支，并过滤出需要处理的分支。返回 (项目对象, 分支名列表)
+    def _get_project_branches(self, project, need_get=False):
+        logging.info("==== 大分割线 ====")
+        logging.info(f"正在处理项目：{project.name}")
+        print("==== 大分割线 ====")
+        print(f"正在处理项目：{project.name}")
+        if need_get is True:
+            # 根据项目id获取项目仓库
+            repo = self.gl.projects.get(project.id)
+        else:
+            repo = project
+        # 再获取到所有分支
+        with self._phase('list_branches'):
+            branches = repo.branches.list(get_all=True)
+
+        # 记录分支的最新提交ID，最新提交相同的分支只处理一次
+        for branch in branches:
+            self.branch_tips[(repo.id, branch.name)] = branch.commit['id']
+
+        # 过滤分支，只获取指定分支
+        with self._phase('filter_branches'):
+            selected_branches = self._filter_branches(branches, repo)
+        # 预过滤：gitlab 中搜索不到被搜索字符串的分支，不再 clone
+        if self.config['prefilter']['enable'] is True and selected_branches:
+            with self._phase('prefilter'):
+                selected_branches = self._prefilter_branches(repo, branches, selected_branches)
+        msg = f"项目 {repo.name} 总计{len(selected_branches)}个分支。"
+        print(msg)
+        logging.info(msg)
+        return repo, selected_branches
+
+    # 预过滤：使用 gitlab 的代码搜索（blobs），跳过搜索不到任何被搜索字符串的分支
+    # per_ref 为 false 时只搜索默认分支，搜索不到则跳过整个项目；为 true 时逐个分支搜索
+    # gitlab 的搜索索引可能滞后：verify 模式下，最近 index_lag_hours 小时内有提交的分支即使搜索不到也照常查询
+    # 搜索接口报错时（比如未开启代码搜索），不过滤
+    def _prefilter_branches(self, repo, branches, selected_branches):
+        prefilter = self.config['prefilter']
+        lag_start = datetime.datetime.now(datetime.timezone.utc) - \
+            datetime.timedelta(hours=prefilter['index_lag_hours'])
+        committed_dates = {branch.name: self._parse_gitlab_time(branch.commit['committed_date']) for branch in branches}
+
+        # 正则模式下搜索正则中必须包含的字符串；提取不出时无法预过滤
+        needles = self._search_needles()
+        if needles is None:
+            return selected_branches
+
+        def has_hits(ref):
+            for pattern in needles:
+                if ref is None:
+                    hits = repo.search('blobs', pattern, per_page=1, get_all=False)
+                else:
+                    hits = repo.search('blobs', pattern, ref=ref, per_page=1, get_all=False)
+                if len(hits) > 0:
+                    return True
+            return False
+
+        try:
+            if prefilter['per_ref'] is True:
+                refs_hit = dict(zip(selected_branches, self._api_map(has_hits, selected_branches)))
+            else:
+                project_hit = has_hits(None)
+                refs_hit = {branch: project_hit for branch in selected_branches}
+        except Exception as e:
+            msg = f"项目 {repo.name} 预过滤搜索失败，不过滤：{e}"
+            print(msg)
+            logging.info(msg)
+            return selected_branches
+
+        kept = []
+        for branch in selected_branches:
+            if refs_hit[branch]:
+                kept.append(branch)
+            elif prefilter['mode'] == 'verify' and committed_dates[branch] >= lag_start:
+                msg = f"预过滤：{repo.name}-{branch} 搜索不到，但最近{prefilter['index_lag_hours']}小时内有提交，仍然查询"
+                print(msg)
+                logging.info(msg)
+                kept.append(branch)
+            else:
+                msg = f"预过滤：{repo.name}-{branch} 在 gitlab 中搜索不到被搜索的字符串，跳过"
+                print(msg)
+                logging.info(msg)
+        return kept
+
+    # 准备分支：clone 到本地（或使用镜像），拿到分支信息和待查询的文件列表
+    # 返回的 unit 中 files 为 [(文件相对路径, blob对象ID)]，path 为工作区目录（checkout）或 git 目录（object）
+    def _prepare_branch(self, branch, repo):
+        unit = {
+            "repo": repo,
+            "branch": branch,
+            "scan_mode": self.config['scan_mode'],
+            "path": None,
+            "files": [],
+            "commit": None,
+            "cleanup": None,
+            "error": None,
+            "metrics": {},
+        }
+        try:
+            if self.config['scan_mode'] == 'object':
+                self._prepare_branch_by_object(unit)
+            else:
+                self._prepare_branch_by_checkout(unit)
+            if self.scan_state is not None:
+                self._apply_scan_state(unit)
+        except Exception as e:
+            unit['error'] = f"项目：{repo.name}，处理分支 {branch} 时出错：{e}"
+        return unit
+
+    # 增量查询：与上次扫描的提交对比，只查询变更过的文件，未变更文件沿用上次的结果（放入 unit['carried']）
+    # 没有上次的记录、搜索条件变化、上次的提交已不存在（比如强制推送）或者浅克隆时，全量查询
+    def _apply_scan_state(self, unit):
+        repo = unit['repo']
+        branch = unit['branch']
+        key = ScanState.make_key(self.config['search_patterns'], self._search_options(), self.config['file_match'])
+        unit['scan_state_key'] = key
+        unit['carried'] = {}
+        state = self.scan_state.load(repo.id, branch)
+        if state is None or state['key'] != key:
+            return
+
+        git_repo = Repo(unit['path'])
+        try:
+            if git_repo.git.rev_parse('--is-shallow-repository') == 'true':
+                return
+            if state['commit'] == unit['commit']['hexsha']:
+                changed = set()
+            else:
+                # 变更的文件（不识别重命名：重命名视为删除 + 新增）
+                diff = git_repo.git.diff('--name-only', '--no-renames', '-z', state['commit'], unit['commit']['hexsha'])
+                changed = set(path for path in diff.split('\0') if path)
+        except Exception as e:
+            msg = f"项目：{repo.name}，分支 {branch} 无法与上次扫描的提交 {state['commit']} 对比，全量查询：{e}"
             logging.info(msg)
             print(msg)
             return
+        finally:
+            git_repo.close()
+
+        # 已删除的文件不在当前的文件列表中，其结果自然被丢弃；上次查询出错的文件重新查询
+        errors = set(state['errors'])
+        # 上次文件分流跳过的文件，沿用时保留跳过原因（旧的扫描记录没有该项）
+        skipped = state.get('skipped', {})
+        for file_path, blob_sha in unit['files']:
+            if file_path not in changed and file_path not in errors:
+                if file_path in skipped:
+                    unit['carried'][file_path] = self._skipped_result(skipped[file_path])
+                else:
+                    unit['carried'][file_path] = {"MatchedLines": state['results'].get(file_path, []), "Error": None}
+        msg = f"增量查询：{repo.name}-{branch}，上次扫描的提交 {state['commit'][:8]}，" \
+              f"变更{len(changed)}个文件，沿用{len(unit['carried'])}个文件的结果"
+        logging.info(msg)
+        print(msg)
 
+    # 检出模式：将分支 clone 到临时目录，遍历工作区获取文件列表
+    def _prepare_branch_by_checkout(self, unit):
+        repo = unit['repo']
+        branch = unit['branch']
         # 检查目录是否存在，如果存在则删除
-        local_repo_path = f"tempdir/{repo.name}-{branch}"
+        local_repo_path = f"{self.temp_dir}/{repo.name}-{branch}"
         local_repo_pathlib = pathlib.Path(local_repo_path)
         if local_repo_pathlib.exists():
             shutil.rmtree(local_repo_path, ignore_errors=True)
 
         # 克隆仓库到本地临时目录
-        local_repo_path = f"tempdir/{repo.name}-{branch}"
-        Repo.clone_from(repo.http_url_to_repo, local_repo_path, branch=branch)
+        # 启用镜像时，从本地镜像 clone（不走网络），否则直接从 gitlab clone
+        if self.config['mirror']['enable'] is True:
+            clone_source = self._get_mirror(repo)
+        else:
+            clone_source = repo.http_url_to_repo
+        unit['cleanup'] = local_repo_path
+        with self._phase('clone', unit['metrics']):
+            self._clone_branch(clone_source, local_repo_path, branch, self.config['mirror']['enable'] is True)
+        unit['metrics']['clone_bytes'] = dir_size(os.path.join(local_repo_path, '.git'))
         print(f"已克隆到本地：{local_repo_path}")
+        unit['path'] = os.path.abspath(local_repo_path)
 
+        local_repo = Repo(local_repo_path)
+        unit['commit'] = self._get_commit_info(local_repo.commit(branch))
+        local_repo.close()
+
+        # 从本地仓库获取文件列表
+        with self._phase('list_files', unit['metrics']):
+            if self.config['file_list_source'] == 'index':
+                # 从 git 索引获取，同时拿到 blob 对象ID
+                unit['files'] = self.find_files_by_git_index(local_repo_path)
+            else:
+                js_files = self.find_files_by_match_name(local_repo_path)
+                # 从 git 索引中拿到每个文件的 blob 对象ID，用于查询结果缓存
+                blob_shas = {}
+                if self.match_cache is not None:
+                    blob_shas = {file_path: blob_sha for file_path, blob_sha in
+                                 self.find_files_by_git_index(local_repo_path)}
+                unit['files'] = [(js_file_path, blob_shas.get(js_file_path)) for js_file_path in js_files]
+
+    # 检出模式下 clone 分支，按 clone.strategy 减少下载和写入磁盘的内容：
+    #   full 完整 clone
+    #   shallow 只获取分支最新提交（--depth 1 --single-branch）
+    #   sparse 在 shallow 基础上延迟下载文件内容（--filter=blob:none），并且只检出符合 file_match 的文件（sparse-checkout）
+    # 从本地镜像 clone 时（from_mirror 为 true），本地 clone 使用硬链接，不需要浅克隆，sparse 只减少写入工作区的文件
+    def _clone_branch(self, clone_source, local_repo_path, branch, from_mirror=False):
+        strategy = self.config['clone']['strategy']
+        sparse_patterns = self._get_sparse_patterns() if strategy == 'sparse' else None
+        clone_options = {}
+        if strategy != 'full' and not from_mirror:
+            clone_options.update({'depth': 1, 'single_branch': True})
+            if strategy == 'sparse':
+                clone_options['filter'] = 'blob:none'
+        if sparse_patterns is not None:
+            clone_options['no_checkout'] = True
+
+        local_repo = Repo.clone_from(clone_source, local_repo_path, branch=branch, **clone_options)
         try:
-            print("开始获取所有匹配的文件")
-            # 从本地仓库获取文件列表
-            js_files = self.find_files_by_match_name(local_repo_path)
+            if sparse_patterns is not None:
+                # 非 cone 模式，规则与 .gitignore 相同；检出时只下载符合规则的文件内容
+                local_repo.git.sparse_checkout('set', '--no-cone', *sparse_patterns)
+                local_repo.git.checkout(branch)
+        finally:
+            local_repo.close()
+
+    # 根据 file_match 生成 sparse-checkout 规则，无法转换时（all、regexp）返回 None，即检出全部文件
+    def _get_sparse_patterns(self):
+        file_match_type = self.config['file_match']['type']
+        if file_match_type not in ['ext', 'normal']:
+            return None
+        patterns = []
+        for file_type in self.config['file_match']['file_type']:
+            # 转义通配符，规则中不含 / 时匹配任意层级目录下的文件名
+            file_type = re.sub(r'([*?\[\]\\])', r'\\\1', file_type)
+            patterns.append(f"*{file_type}" if file_match_type == 'ext' else f"*{file_type}*")
+        return patterns
+
+    # 对象库模式：不检出工作区，直接从 git 对象库读取分支的文件树
+    def _prepare_branch_by_object(self, unit):
+        repo = unit['repo']
+        branch = unit['branch']
+        with self._phase('clone', unit['metrics']):
+            if self.config['mirror']['enable'] is True:
+                git_dir = self._get_mirror(repo)
+            else:
+                # 未启用镜像时，clone 一个只包含该分支的 bare 仓库
+                local_repo_path = f"{self.temp_dir}/{repo.name}-{branch}.git"
+                shutil.rmtree(local_repo_path, ignore_errors=True)
+                unit['cleanup'] = local_repo_path
+                clone_options = {}
+                # 对象库模式需要读取文件内容，不使用 blob:none（否则每个文件都要单独下载一次），只做浅克隆
+                if self.config['clone']['strategy'] != 'full':
+                    clone_options['depth'] = 1
+                Repo.clone_from(repo.http_url_to_repo, local_repo_path, bare=True, branch=branch, single_branch=True,
+                                **clone_options)
+                unit['metrics']['clone_bytes'] = dir_size(local_repo_path)
+                print(f"已克隆到本地：{local_repo_path}")
+                git_dir = local_repo_path
+        unit['path'] = os.path.abspath(git_dir)
+        with self._phase('list_files', unit['metrics']):
+            self._read_branch_tree(unit)
+
+    # 从 git 对象库读取分支最新提交的信息和待查询的文件列表（unit['path'] 为 git 目录）
+    def _read_branch_tree(self, unit):
+        git_repo = Repo(unit['path'])
+        try:
+            branch_commit = git_repo.commit(f"refs/heads/{unit['branch']}")
+            unit['commit'] = self._get_commit_info(branch_commit)
+            unit['files'] = self.find_blobs_by_match_name(branch_commit.tree)
+        finally:
+            # 关闭常驻的 git 进程
+            git_repo.close()
+
+    # 建立 / 增量更新 trigram 索引（--index-build）
+    # 分支从本地镜像读取（无论 mirror.enable 是否启用，索引都依赖镜像，查询时直接从镜像读取文件内容）
+    # 分支最新提交没变时跳过；只为索引中还没有的文件内容（blob）提取 trigram
+    def _build_index(self, units):
+        index = TrigramIndex(self.config['trigram_index']['path'])
+        search_workers = self.config['concurrency']['search_workers'] or os.cpu_count()
+        # 每个项目本次选中的分支，索引中该项目的其他分支会被删除
+        project_branches = {}
+        added_blobs = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.config['concurrency']['io_workers']) as io_pool, \
+                    ProcessPoolExecutor(max_workers=search_workers,
+                                        mp_context=multiprocessing.get_context('spawn')) as index_pool:
+                futures = [io_pool.submit(self._prepare_index_ref, branch, repo) for repo, branch in units]
+                for ord, future in enumerate(futures):
+                    unit = future.result()
+                    repo = unit['repo']
+                    branch = unit['branch']
+                    project_branches.setdefault(repo.id, set()).add(branch)
+                    if unit['error'] is not None:
+                        self.err_logger.error(unit['error'])
+                        continue
+
+                    if index.get_ref_commit(repo.id, branch) == unit['commit']['hexsha']:
+                        index.touch_ref(repo.id, branch, ord)
+                        msg = f"索引未变化，跳过：{repo.name}-{branch}"
+                        logging.info(msg)
+                        print(msg)
+                        continue
+
+                    # 只为新的文件内容提取 trigram（在进程池中执行）
+                    missing = index.missing_blobs([blob_sha for file_path, blob_sha in unit['files']])
+                    chunk_size = self.SEARCH_CHUNK_SIZE
+                    index_futures = [index_pool.submit(_extract_blob_trigrams, unit['path'], missing[i:i + chunk_size])
+                                     for i in range(0, len(missing), chunk_size)]
+                    for index_future in index_futures:
+                        for blob_sha, size, trigrams in index_future.result():
+                            index.add_blob(blob_sha, size, trigrams)
+                    index.update_ref(repo.id, repo.name, branch, unit['commit'], unit['path'], unit['files'], ord)
+                    index.commit()
+                    added_blobs += len(missing)
+                    msg = f"已建立索引：{repo.name}-{branch}，{len(unit['files'])}个文件，新增{len(missing)}个文件内容"
+                    logging.info(msg)
+                    print(msg)
 
-            # 添加分支信息到 branch.log
-            local_repo = Repo(local_repo_path)
-            branch_commit = local_repo.commit(branch)
-            commit_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(branch_commit.committed_date))
-            branch_info = f"{repo.name}-{branch}-{branch_commit.hexsha}-{commit_time}-{branch_commit.author}"
-            self.branch_logger.info(branch_info)
-
-            print("开始遍历所有文件进行查询")
-            # 遍历所有匹配的文件
-            for js_file_path in js_files:
-                logging.info(f"正在处理文件：{os.path.abspath(os.path.join(local_repo_path, js_file_path))}")
-                print(f"正在处理文件：{os.path.abspath(os.path.join(local_repo_path, js_file_path))}")
-                # if os.path.abspath(os.path.join(local_repo_path,
-                #                                 js_file_path)) == "/Users/wangdong/githubProject/python3-lib/在git项目里寻找某个接口是否有调用/Special-864/src/api/wd.js":
-                #     print("debug")
-                if self.config['file_search_engine'] == "python":
-                    # 使用 python 来查询文件
-                    search_result = self.search_string_in_file_by_python(
-                        os.path.join(local_repo_path, js_file_path),
-                        self.config['string_to_search'])
-                else:
-                    search_result = self.search_string_in_file_by_go(
-                        os.path.join(local_repo_path, js_file_path),
-                        self.config['string_to_search'])
+            for project_id, branches in project_branches.items():
+                index.remove_other_refs(project_id, branches)
+            pruned = index.prune()
+            stats = index.stats()
+            msg = f"索引更新完毕：{stats['refs']}个分支，{stats['files']}个文件，{stats['blobs']}个文件内容" \
+                  f"（本次新增{added_blobs}个，清理{pruned}个）"
+            logging.info(msg)
+            print(msg)
+        finally:
+            index.close()
+
+    # 建立索引时准备分支：更新本地镜像，读取分支的文件树
+    def _prepare_index_ref(self, branch, repo):
+        unit = {
+            "repo": repo,
+            "branch": branch,
+            "path": None,
+            "files": [],
+            "commit": None,
+            "error": None,
+        }
+        try:
+            unit['path'] = os.path.abspath(self._get_mirror(repo))
+            self._read_branch_tree(unit)
+        except Exception as e:
+            unit['error'] = f"项目：{repo.name}，建立分支 {branch} 的索引时出错：{e}"
+        return unit
 
-                if search_result['Error'] is not None:
-                    # 如果有报错信息，说明在查找该文件的时候出问题了
-                    self.err_logger.info(search_result['Error'])
-                else:
-                    # 此时正常，拿到匹配的行数
-                    matched_lines = search_result['MatchedLines']
+    # 使用 trigram 索引查询（--index-query）：不访问 gitlab，索引缩小候选文件范围后，从镜像读取文件内容确认
+    # 结果输出格式与普通查询一致
+    def _query_index(self):
+        index = TrigramIndex(self.config['trigram_index']['path'])
+        try:
+            needles = self._search_needles()
+            candidates = None if needles is None else index.candidates([needle.encode('utf-8') for needle in needles])
+            units = []
+            for ref in index.refs():
+                units.append({
+                    "repo": types.SimpleNamespace(id=ref['project_id'], name=ref['project_name']),
+                    "branch": ref['branch'],
+                    "scan_mode": 'object',
+                    "path": ref['git_dir'],
+                    "files": index.ref_files(ref['project_id'], ref['branch'], candidates),
+                    "commit": ref['commit'],
+                    "cleanup": None,
+                    "error": None,
+                })
+        finally:
+            index.close()
 
-                    # 长度 > 0 ，说明有匹配的代码
-                    if len(matched_lines) > 0:
-                        for matched_line in matched_lines:
-                            match_info = f"{repo.name}-{branch}-{js_file_path}-{matched_line['LineNumber']}-{matched_line['Line'].strip()}"
-                            logging.info(match_info)
-                            # 写入 match.log
-                            self.match_logger.info(match_info)
+        file_count = sum(len(unit['files']) for unit in units)
+        msg = f"本次处理的模式是：索引查询。索引中共{len(units)}个分支，候选文件{file_count}个"
+        if candidates is None:
+            msg += "（被搜索的字符串不足3个字节，无法使用索引，查询所有文件）"
+        logging.info(msg)
+        print(msg)
+        self._deal_units(units, self._check_indexed_unit)
+
+    # 索引查询时检查分支的镜像是否还在
+    def _check_indexed_unit(self, unit):
+        if not os.path.exists(unit['path']):
+            unit['error'] = f"项目：{unit['repo'].name}，分支 {unit['branch']} 的镜像不存在：{unit['path']}，请重新建立索引"
+        return unit
+
+    # 本次运行内记录的 blob 查询结果是否还没有达到上限
+    def _run_results_has_room(self):
+        return len(self.run_results) + len(self.run_pending) < self.RUN_RESULTS_MAX_BLOBS
+
+    # 提交查询：先查缓存，未命中的文件按批提交到查询进程池
+    def _submit_search(self, unit, search_pool):
+        # 增量查询时，未变更文件直接沿用上次的结果
+        unit['cached'] = dict(unit.get('carried', {}))
+        unit['cache_keys'] = {}
+        unit['search_futures'] = []
+        # 内容与之前的文件相同、但查询结果还没出来的文件（文件相对路径 -> blob对象ID）
+        unit['deferred'] = {}
+        unit['files_deduped'] = 0
+        # 本分支提交查询的 blob 对象ID（分支处理出错时，从 run_pending 中移除）
+        unit['pending'] = []
+        if unit['error'] is not None or 'shared_tip' in unit or 'resumed' in unit:
+            return
 
-                            # 将匹配结果添加到 Excel 工作表
-                            self.worksheet.append([repo.name, branch, js_file_path, matched_line['LineNumber'],
-                                                   matched_line['Line'].strip()])
+        dedupe = self.config['dedupe']['enable'] is True
+        attributes = None
+        if self.config['triage']['enable'] is True and self.config['triage']['gitattributes'] is True:
+            attributes = self._read_gitattributes(unit)
+        to_search = []
+        for file_path, blob_sha in unit['files']:
+            if file_path in unit['cached']:
+                continue
+            # .gitattributes 中标记为二进制、生成的、第三方的文件，不查询
+            if attributes is not None:
+                reason = attributes.skip_reason(file_path)
+                if reason is not None:
+                    unit['cached'][file_path] = self._skipped_result(reason)
+                    continue
+            # 本次运行中查询过相同内容的文件，直接使用其结果
+            if dedupe and blob_sha is not None:
+                if blob_sha in self.run_results:
+                    unit['cached'][file_path] = self.run_results[blob_sha]
+                    unit['files_deduped'] += 1
+                    continue
+                if blob_sha in self.run_pending:
+                    unit['deferred'][file_path] = blob_sha
+                    continue
+            if self.match_cache is not None and blob_sha is not None:
+                key = MatchCache.make_key(blob_sha, self.config['search_patterns'], self._search_options())
+                matched_lines = self.match_cache.get(key)
+                if matched_lines is not None:
+                    unit['cached'][file_path] = {"MatchedLines": matched_lines, "Error": None}
+                    # 缓存命中的结果也记录下来，之后内容相同的文件直接使用
+                    if dedupe and self._run_results_has_room():
+                        self.run_results[blob_sha] = unit['cached'][file_path]
+                    continue
+                unit['cache_keys'][file_path] = key
+            # 提交查询后、结果出来之前，内容相同的文件等待该结果（见 _deal_branch_result）
+            if dedupe and blob_sha is not None and self._run_results_has_room():
+                self.run_pending.add(blob_sha)
+                unit['pending'].append(blob_sha)
+            to_search.append((file_path, blob_sha))
+
+        # go 引擎在 go 库内部并行，整个分支作为一个任务，只调用一次 go 库
+        chunk_size = self.SEARCH_CHUNK_SIZE
+        if unit['scan_mode'] == 'checkout' and self.config['file_search_engine'] == 'go':
+            chunk_size = max(len(to_search), 1)
+        for i in range(0, len(to_search), chunk_size):
+            task = {
+                "scan_mode": unit['scan_mode'],
+                "path": unit['path'],
+                "files": to_search[i:i + chunk_size],
+            }
+            unit['search_futures'].append(search_pool.submit(_search_files_in_worker, self.config, task))
+
+    # 查询一批文件，返回 [(文件相对路径, 查询结果)]
+    # task 中 files 为 [(文件相对路径, blob对象ID)]。checkout 模式从工作区读取文件，object 模式从 git 对象库读取 blob
+    def search_files(self, task):
+        results = []
+        search_string = self.config['search_patterns']
+        triage = self.config['triage']['enable'] is True
+        if task['scan_mode'] == 'object':
+            # blob 内容通过常驻的 git cat-file --batch 进程批量读取，在内存中查询
+            # mmap 引擎直接在字节内容中查询，其他引擎使用 python 引擎
+            git_repo = Repo(task['path'])
+            try:
+                for file_path, blob_sha in task['files']:
+                    self._trace_file(f"正在处理文件：{file_path}")
+                    # 过大的文件只读取对象大小，不读取内容
+                    if triage and self._triage_size(git_repo.odb.info(hex_to_bin(blob_sha)).size) is not None:
+                        results.append((file_path, self._skipped_result('too_large')))
+                        continue
+                    content = git_repo.odb.stream(hex_to_bin(blob_sha)).read()
+                    self.bytes_read += len(content)
+                    sniff_bytes = self.config['triage']['sniff_bytes']
+                    reason = self._triage_content(content[:sniff_bytes], len(content) <= sniff_bytes) if triage else None
+                    if reason is not None:
+                        search_result = self._skipped_result(reason)
+                    elif self.config['file_search_engine'] == "mmap":
+                        search_result = {"MatchedLines": self.search_string_in_bytes(content, search_string),
+                                         "Error": None}
+                    else:
+                        search_result = self.search_string_in_content_by_python(content, search_string, file_path)
+                    results.append((file_path, search_result))
+            finally:
+                git_repo.close()
+        elif self.config['file_search_engine'] == "go" and self._go_batch_supported():
+            # go 库批量查询，整批文件只调用一次（跳过的文件不交给 go 库）
+            skipped = {}
+            file_paths = []
+            for file_path, blob_sha in task['files']:
+                reason = self._triage_path(os.path.join(task['path'], file_path)) if triage else None
+                if reason is not None:
+                    skipped[file_path] = self._skipped_result(reason)
+                else:
+                    file_paths.append(file_path)
+            self._trace_file(f"正在处理文件：{task['path']} 下 {len(file_paths)} 个文件")
+            searched = dict(self.search_files_by_go_batch(task['path'], file_paths, search_string))
+            results = [(file_path, skipped[file_path] if file_path in skipped else searched[file_path])
+                       for file_path, blob_sha in task['files']]
+            self.bytes_read += sum(self._file_size(os.path.join(task['path'], file_path)) for file_path in file_paths)
+        else:
+            if self.config['file_search_engine'] == "python":
+                # 使用 python 来查询文件
+                search_engine = self.search_string_in_file_by_python
+            elif self.config['file_search_engine'] == "mmap":
+                # 使用内存映射查询文件
+                search_engine = self.search_string_in_file_by_mmap
+            else:
+                search_engine = self.search_string_in_file_by_go
+            for file_path, blob_sha in task['files']:
+                self._trace_file(f"正在处理文件：{os.path.join(task['path'], file_path)}")
+                reason = self._triage_path(os.path.join(task['path'], file_path)) if triage else None
+                if reason is not None:
+                    results.append((file_path, self._skipped_result(reason)))
+                    continue
+                results.append((file_path, search_engine(os.path.join(task['path'], file_path), search_string)))
+                self.bytes_read += self._file_size(os.path.join(task['path'], file_path))
+        return results
+
+    # 文件分流：过大的文件跳过，返回跳过原因，不跳过返回 None
+    def _triage_size(self, size):
+        max_file_size = self.config['triage']['max_file_size']
+        if max_file_size > 0 and size > max_file_size:
+            return 'too_large'
+        return None
+
+    # 文件分流：根据文件开头的一段内容判断是否为二进制文件（包含 NUL 字节）或不是 utf-8 编码
+    # complete 表示 head 已经是完整的文件内容（否则末尾被截断的多字节字符不算编码错误）
+    def _triage_content(self, head, complete):
+        if b'\0' in head:
+            return 'binary'
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(head, final=complete)
+        except UnicodeDecodeError:
+            return 'non_utf8'
+        return None
+
+    # 文件分流（检出模式）：先看文件大小，再读取文件开头的一段内容判断
+    # 读取出错时不跳过，由查询引擎报告错误
+    def _triage_path(self, file_path):
+        sniff_bytes = self.config['triage']['sniff_bytes']
+        try:
+            size = os.path.getsize(file_path)
+            reason = self._triage_size(size)
+            if reason is None:
+                with open(file_path, 'rb') as file:
+                    head = file.read(sniff_bytes)
+                reason = self._triage_content(head, size <= sniff_bytes)
+        except OSError:
+            return None
+        return reason
+
+    # 跳过的文件的查询结果（没有匹配，Skipped 为跳过原因）
+    def _skipped_result(self, reason):
+        return {"MatchedLines": [], "Error": None, "Skipped": reason}
+
+    # 读取分支根目录的 .gitattributes，没有则返回 None
+    # 检出模式优先读取工作区中的文件（本地模式可能有未提交的修改），否则从 git 对象库读取（稀疏检出时工作区中没有该文件）
+    def _read_gitattributes(self, unit):
+        try:
+            disk_path = os.path.join(unit['path'], '.gitattributes')
+            if unit['scan_mode'] == 'checkout' and os.path.exists(disk_path):
+                with open(disk_path, 'rb') as file:
+                    content = file.read()
+            elif unit['commit'] is not None:
+                git_repo = Repo(unit['path'])
+                try:
+                    content = git_repo.commit(unit['commit']['hexsha']).tree['.gitattributes'].data_stream.read()
+                finally:
+                    git_repo.close()
+            else:
+                return None
+        except (OSError, KeyError, ValueError) as e:
+            if not isinstance(e, KeyError):
+                logging.info(f"读取 .gitattributes 失败：{unit['path']}，{e}")
+            return None
+        return GitAttributes(content.decode('utf-8', errors='replace'))
+
+    # 文件大小，文件不存在时返回 0
+    def _file_size(self, file_path):
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
+    # 写入一个分支的结果（按文件列表的原始顺序），然后删除临时目录
+    def _deal_branch_result(self, unit):
+        repo = unit['repo']
+        branch = unit['branch']
+        logging.info(f"----- 小分割线 -----")
+        msg = f"正在处理分支：{repo.name}-{branch}"
+        logging.info(msg)
+        print(msg)
+        # 分支统计
+        record = unit.setdefault('metrics', {})
+        record.update({"project": repo.name, "branch": branch, "scan_mode": unit['scan_mode'],
+                       "files": len(unit['files']), "files_searched": 0, "bytes_read": 0, "matches": 0,
+                       "error": unit['error']})
+        # 本分支写入的匹配结果和文件错误（写入分支处理记录）
+        journal = {"rows": [], "file_errors": []} if self.journal is not None else None
+        try:
+            if unit['error'] is not None:
+                self.err_logger.error(unit['error'])
+                return
+            if 'shared_tip' in unit:
+                self._deal_shared_branch_result(unit, record, journal)
+                return
+            if 'resumed' in unit:
+                self._deal_resumed_branch_result(unit, record)
+                return
 
+            # 添加分支信息到 branch.log
+            self._log_branch_info(repo, branch, unit['commit'])
+
+            blob_shas = dict(unit['files'])
+            search_results = dict(unit['cached'])
+            for future in unit['search_futures']:
+                task_results, task_stats = future.result()
+                record['files_searched'] += task_stats['files']
+                record['bytes_read'] += task_stats['bytes_read']
+                record['search_seconds'] = record.get('search_seconds', 0) + task_stats['seconds']
+                if self.metrics is not None:
+                    self.metrics.add_phase('search', task_stats['seconds'])
+                for file_path, search_result in task_results:
+                    search_results[file_path] = search_result
+                    # 记录本次运行的查询结果（查询出错的不记录）
+                    blob_sha = blob_shas.get(file_path)
+                    if blob_sha is not None and blob_sha in self.run_pending:
+                        self.run_pending.discard(blob_sha)
+                        if search_result['Error'] is None:
+                            self.run_results[blob_sha] = search_result
+                    # 写入查询结果缓存（查询出错的结果不缓存；文件分流跳过的文件也不缓存，下次重新判断，保留跳过原因）
+                    key = unit['cache_keys'].get(file_path)
+                    if key is not None and search_result['Error'] is None and 'Skipped' not in search_result:
+                        self.match_cache.put(key, search_result['MatchedLines'] or [])
+
+            # 内容与之前的文件相同的文件，使用其结果；之前的文件查询出错时，在这里重新查询
+            retry = []
+            for file_path, blob_sha in unit['deferred'].items():
+                if blob_sha in self.run_results:
+                    search_results[file_path] = self.run_results[blob_sha]
+                else:
+                    retry.append((file_path, blob_sha))
+            if retry:
+                task = {"scan_mode": unit['scan_mode'], "path": unit['path'], "files": retry}
+                for file_path, search_result in self.search_files(task):
+                    search_results[file_path] = search_result
+            record['files_deduped'] = unit['files_deduped'] + len(unit['deferred']) - len(retry)
+
+            skipped = {}
+            with self._phase('write_results', record):
+                for file_path, blob_sha in unit['files']:
+                    self._deal_search_result(repo, branch, file_path, search_results[file_path], journal)
+                    record['matches'] += len(search_results[file_path]['MatchedLines'] or [])
+                    reason = search_results[file_path].get('Skipped')
+                    if reason is not None:
+                        skipped[reason] = skipped.get(reason, 0) + 1
+            self._report_skipped(repo, branch, skipped, record)
+
+            # 记录该最新提交的结果（只保留有匹配或跳过的文件），最新提交相同的分支直接使用
+            # 有文件查询出错时不记录（错误信息中是本分支的临时目录），最新提交相同的分支自己重新查询
+            tip = self.branch_tips.get((repo.id, branch))
+            if self.config['dedupe']['enable'] is True and tip is not None and \
+                    all(search_results[file_path]['Error'] is None for file_path, blob_sha in unit['files']):
+                self.tip_results[tip] = {
+                    "commit": unit['commit'],
+                    "files": len(unit['files']),
+                    "skipped": skipped,
+                    "results": [(file_path, search_results[file_path]) for file_path, blob_sha in unit['files']
+                                if search_results[file_path]['MatchedLines'] or 'Skipped' in search_results[file_path]],
+                }
 
+            # 保存本次的扫描记录，供下次增量查询使用
+            if 'scan_state_key' in unit:
+                results = {}
+                errors = []
+                skipped_files = {}
+                for file_path, blob_sha in unit['files']:
+                    search_result = search_results[file_path]
+                    if search_result['Error'] is not None:
+                        errors.append(file_path)
+                    elif 'Skipped' in search_result:
+                        skipped_files[file_path] = search_result['Skipped']
+                    elif search_result['MatchedLines']:
+                        results[file_path] = search_result['MatchedLines']
+                self.scan_state.save(repo.id, branch, unit['scan_state_key'], unit['commit']['hexsha'], results, errors,
+                                     skipped_files)
         except Exception as e:
-            self.err_logger.error(f"项目：{repo.name}，处理分支 {branch} 时出错：{e}")
+            record['error'] = f"项目：{repo.name}，处理分支 {branch} 时出错：{e}"
+            self.err_logger.error(record['error'])
         finally:
             # 删除本地仓库临时目录
-            shutil.rmtree(local_repo_path, ignore_errors=True)
+            if unit['cleanup'] is not None:
+                shutil.rmtree(unit['cleanup'], ignore_errors=True)
+            # 查询出错时没有结果的 blob，不再让之后的分支等待
+            self.run_pending.difference_update(unit.get('pending', []))
+            self._record_branch_metrics(unit, record)
+            self._journal_unit(unit, record, journal)
+
+    # 写入最新提交与之前的分支相同的分支的结果（直接使用之前分支的结果）
+    # 之前的分支处理失败时，该分支会重新查询（见 _deal_units），不会到这里
+    def _deal_shared_branch_result(self, unit, record, journal):
+        repo = unit['repo']
+        branch = unit['branch']
+        shared = self.tip_results[unit['shared_tip']]
+        first_branch = self.tips_submitted[unit['shared_tip']]
+        msg = f"分支 {repo.name}-{branch} 与 {first_branch} 的最新提交相同，直接使用其结果"
+        logging.info(msg)
+        print(msg)
+        unit['commit'] = shared['commit']
+        self._log_branch_info(repo, branch, shared['commit'])
+        record['files'] = shared['files']
+        record['shared_with'] = first_branch
+        with self._phase('write_results', record):
+            for file_path, search_result in shared['results']:
+                self._deal_search_result(repo, branch, file_path, search_result, journal)
+                record['matches'] += len(search_result['MatchedLines'] or [])
+        self._report_skipped(repo, branch, shared['skipped'], record)
+        # 保存本次的扫描记录，供下次增量查询使用
+        if self.scan_state is not None:
+            key = ScanState.make_key(self.config['search_patterns'], self._search_options(), self.config['file_match'])
+            results = {file_path: search_result['MatchedLines'] for file_path, search_result in shared['results']
+                       if 'Skipped' not in search_result}
+            skipped_files = {file_path: search_result['Skipped'] for file_path, search_result in shared['results']
+                             if 'Skipped' in search_result}
+            self.scan_state.save(repo.id, branch, key, shared['commit']['hexsha'], results, [], skipped_files)
+
+    # 写入上次运行中已完成的分支的结果（来自分支处理记录，与上次写入的内容相同）
+    def _deal_resumed_branch_result(self, unit, record):
+        resumed = unit['resumed']
+        unit['commit'] = resumed['commit']
+        self._log_branch_info(unit['repo'], unit['branch'], resumed['commit'])
+        for error in resumed['file_errors']:
+            self.err_logger.info(error)
+        with self._phase('write_results', record):
+            for row in resumed['rows']:
+                self._write_match_row(row)
+        record['files'] = resumed['files']
+        record['matches'] = len(resumed['rows'])
+        record['resumed'] = True
+
+    # 输出并记录分支中跳过的文件数（skipped：{跳过原因: 文件数}）
+    def _report_skipped(self, repo, branch, skipped, record):
+        record['files_skipped'] = sum(skipped.values())
+        if not skipped:
+            return
+        record['skipped'] = skipped
+        msg = f"分支 {repo.name}-{branch} 跳过{record['files_skipped']}个文件：" + \
+              "，".join(f"{self.SKIP_REASONS[reason]}{count}个" for reason, count in skipped.items())
+        logging.info(msg)
+        print(msg)
+
+    # 写入分支处理记录（units.jsonl），分支按处理顺序编号。上次已完成的分支已有记录，不重复写入
+    def _journal_unit(self, unit, record, journal):
+        if self.journal is None:
+            return
+        repo = unit['repo']
+        branch_index = self.branch_counts.get(repo.id, 0)
+        self.branch_counts[repo.id] = branch_index + 1
+        if 'resumed' in unit:
+            return
+        self.journal.append({
+            "type": 'unit',
+            "order": [self.project_order.get(repo.id, 0), branch_index],
+            "project_id": str(repo.id),
+            "project": repo.name,
+            "branch": unit['branch'],
+            "tip": self.branch_tips.get((repo.id, unit['branch'])),
+            "commit": unit['commit'],
+            "error": record['error'],
+            "files": record['files'],
+            "rows": journal['rows'],
+            "file_errors": journal['file_errors'],
+        })
+
+    # 写入分支统计，并记录耗时最长的分支
+    def _record_branch_metrics(self, unit, record):
+        if self.metrics is None:
+            return
+        self.metrics.add_branch(record)
+        seconds = sum(value for key, value in record.items() if key.endswith('_seconds'))
+        if 'source' in unit and (self.slowest_branch is None or seconds > self.slowest_branch[0]):
+            self.slowest_branch = (seconds, unit['source'])
+
+    # 输出运行统计的汇总
+    def _report_metrics(self):
+        summary = self.metrics.close()
+        lines = ["==== 运行统计 ====", f"总耗时：{summary['elapsed_seconds']:.2f} 秒"]
+        totals = summary['totals']
+        lines.append(f"分支{summary['branches']}个（出错{summary['branch_errors']}个），文件{totals['files']}个"
+                     f"（实际查询{totals['files_searched']}个），读取{totals['bytes_read']}字节，匹配{totals['matches']}行，"
+                     f"clone {totals['clone_bytes']}字节，镜像增加{summary['counters'].get('mirror_bytes', 0)}字节")
+        skipped = {}
+        for record in self.metrics.branches:
+            for reason, count in record.get('skipped', {}).items():
+                skipped[reason] = skipped.get(reason, 0) + count
+        if skipped:
+            lines.append(f"跳过文件{totals['files_skipped']}个：" +
+                         "，".join(f"{self.SKIP_REASONS[reason]}{count}个" for reason, count in skipped.items()))
+        lines.append("各阶段耗时（并发执行时为所有线程 / 进程的累计值）：")
+        for name, phase in summary['phases'].items():
+            lines.append(f"    {name}：{phase['seconds']:.2f} 秒（{phase['count']}次）")
+        lines.append(f"gitlab api 请求{summary['api_request_count']}次：")
+        for route, api in sorted(summary['api_requests'].items(), key=lambda item: -item[1]['count']):
+            lines.append(f"    {route}：{api['count']}次，{api['seconds']:.2f} 秒")
+        slowest = sorted(self.metrics.branches, reverse=True,
+                         key=lambda record: sum(v for k, v in record.items() if k.endswith('_seconds')))[:5]
+        if slowest:
+            lines.append("耗时最长的分支：")
+        for record in slowest:
+            seconds = sum(v for k, v in record.items() if k.endswith('_seconds'))
+            lines.append(f"    {record['project']}-{record['branch']}：{seconds:.2f} 秒")
+        for line in lines:
+            logging.info(line)
+            print(line)
+
+    # 对耗时最长的分支重新执行一次（准备 + 查询，不写入结果），输出 cProfile 结果
+    # 查询在当前进程中执行，才能统计到查询引擎内部的耗时
+    def _profile_slowest_branch(self):
+        if self.slowest_branch is None:
+            return
+        seconds, (prepare, source) = self.slowest_branch
+        profiler = cProfile.Profile()
+        profiler.enable()
+        unit = prepare(source)
+        try:
+            if unit['error'] is None:
+                self.search_files({"scan_mode": unit['scan_mode'], "path": unit['path'], "files": unit['files']})
+        finally:
+            profiler.disable()
+            if unit['cleanup'] is not None:
+                shutil.rmtree(unit['cleanup'], ignore_errors=True)
+        profiler.dump_stats(os.path.join(self.log_dir, 'profile_slowest.prof'))
+        with open(os.path.join(self.log_dir, 'profile_slowest.txt'), 'w', encoding='utf-8') as file:
+            file.write(f"分支：{unit['repo'].name}-{unit['branch']}，本次运行耗时 {seconds:.2f} 秒\n")
+            pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(50)
+        msg = f"已对耗时最长的分支 {unit['repo'].name}-{unit['branch']} 进行性能分析：{self.log_dir}/profile_slowest.prof"
+        logging.info(msg)
+        print(msg)
+
+    # 提取分支最新提交的信息
+    def _get_commit_info(self, branch_commit):
+        return {
+            "hexsha": branch_commit.hexsha,
+            "committed_date": branch_commit.committed_date,
+            "author": str(branch_commit.author),
+        }
+
+    # 添加分支信息到 branch.log
+    def _log_branch_info(self, repo, branch, commit):
+        commit_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(commit['committed_date']))
+        branch_info = f"{repo.name}-{branch}-{commit['hexsha']}-{commit_time}-{commit['author']}"
+        self.branch_logger.info(branch_info)
+
+    # 处理单个文件的查询结果：报错写入 err.log，匹配结果写入日志和 Excel
+    # journal 不为 None 时，同时记录写入的匹配结果和错误（见 _deal_branch_result）
+    def _deal_search_result(self, repo, branch, file_path, search_result, journal=None):
+        if search_result['Error'] is not None:
+            # 如果有报错信息，说明在查找该文件的时候出问题了
+            self.err_logger.info(search_result['Error'])
+            if journal is not None:
+                journal['file_errors'].append(search_result['Error'])
+            return
+
+        # 此时正常，拿到匹配的行数。长度 > 0 ，说明有匹配的代码
+        for matched_line in search_result['MatchedLines'] or []:
+            pattern = matched_line.get('Pattern', '')
+            row = [repo.name, branch, file_path, matched_line['LineNumber'], pattern, matched_line['Line'].strip()]
+            self._write_match_row(row)
+            if journal is not None:
+                journal['rows'].append(row)
+
+    # 写入一条匹配结果：match.log（同时也会记录到 output.log），以及 Excel / CSV / JSONL
+    def _write_match_row(self, row):
+        match_info = "-".join(str(value) for value in row)
+        self.match_logger.info(match_info)
+        for sink in self.sinks:
+            sink.write(row)
 
     # 分支处理模式
     def _branch_option(self):
@@ -469,29 +2177,8 @@ class GitTool:
         print("—————— 配置说明分割线（结束） ——————")
         logging.info("—————— 配置说明分割线（结束） ——————")
 
-        # 先获取要处理哪些项目
-        projects = self._filter_projects_by_group()
-
-        # 遍历项目
-        for project in projects:
-            logging.info("==== 大分割线 ====")
-            logging.info(f"正在处理项目：{project.name}")
-            print("==== 大分割线 ====")
-            print(f"正在处理项目：{project.name}")
-            # 根据项目id获取项目仓库
-            repo = self.gl.projects.get(project.id)
-            # 再获取到所有分支
-            branches = repo.branches.list(get_all=True)
-
-            # 过滤分支，只获取指定分支
-            selected_branches = self._filter_branches(branches, repo)
-
-            msg = f"总计{len(selected_branches)}个分支。"
-            print(msg)
-            logging.info(msg)
-            for branch in selected_branches:
-                # 将项目clone到本地进行处理
-                self._clone_and_deal(branch, repo)
+        # 边列出项目边处理（列表接口返回的项目对象可以直接使用，不需要再根据项目id获取）
+        self._deal_projects(self._filter_projects_by_group())
 
     # 单项目模式
     def _search_by_model_repository(self):
@@ -527,17 +2214,8 @@ class GitTool:
         print("—————— 配置说明分割线（结束） ——————")
         logging.info("—————— 配置说明分割线（结束） ——————")
 
-        # 再获取到所有分支
-        branches = repo.branches.list(get_all=True)
-
-        # 过滤分支，只获取指定分支
-        selected_branches = self._filter_branches(branches, repo)
-        msg = f"总计{len(selected_branches)}个分支。"
-        print(msg)
-        logging.info(msg)
-        for branch in selected_branches:
-            # 将项目clone到本地进行处理
-            self._clone_and_deal(branch, repo)
+        # 获取分支并处理
+        self._deal_projects([repo])
 
     # 多项目模式
     def _get_projects_by_model_repositories(self):
@@ -551,22 +2229,26 @@ class GitTool:
 
         # 先判断是什么模式
         if self.config['type_repositories']['repositories_model'] == 'name':
+            repo_names = []
             for repo_name in self.config['type_repositories']['repositories_name']:
                 # 处理一下，如果是全链接，则移除前面那部分gitlab的地址
                 repo_name = repo_name.replace(self.config['gitlab_api_url'], '')
                 # 再处理一下，如果第一个字母是 / ，则删除
                 if repo_name.startswith("/") is True:
                     repo_name = repo_name[1:]
-                repo = self.gl.projects.get(repo_name)
-                project_list.append(repo)
+                repo_names.append(repo_name)
+            # 并发获取项目
+            with self._phase('discover_projects'):
+                project_list = self._api_map(self.gl.projects.get, repo_names)
             name_list = [project.name for project in project_list]
             msg = f"项目选择方式是：根据名称获取项目。项目有：{name_list}"
             logging.info(msg)
             print(msg)
         elif self.config['type_repositories']['repositories_model'] == 'id':
-            for repo_id in self.config['type_repositories']['repositories_id']:
-                repo = self.gl.projects.get(repo_id)
-                project_list.append(repo)
+            # 并发获取项目
+            with self._phase('discover_projects'):
+                project_list = self._api_map(self.gl.projects.get,
+                                             self.config['type_repositories']['repositories_id'])
 
             name_list = [project.name for project in project_list]
             msg = f"项目选择方式是：根据仓库ID获取项目。项目ID是：{self.config['type_repositories']['repositories_id']}，项目名称是：{name_list}"
@@ -580,63 +2262,281 @@ class GitTool:
         logging.info("—————— 配置说明分割线（结束） ——————")
 
         # 遍历所有项目
-        for project in project_list:
-            logging.info("==== 大分割线 ====")
-            logging.info(f"正在处理项目：{project.name}")
-            print("==== 大分割线 ====")
-            print(f"正在处理项目：{project.name}")
-            # 再获取到所有分支
-            branches = project.branches.list(get_all=True)
-
-            # 过滤分支，只获取指定分支
-            selected_branches = self._filter_branches(branches, project)
-            msg = f"总计{len(selected_branches)}个分支。"
-            print(msg)
-            logging.info(msg)
-            for branch in selected_branches:
-                # 将项目clone到本地进行处理
-                self._clone_and_deal(branch, project)
+        self._deal_projects(project_list)
 
-    # 本地模式
+    # 本地模式：直接查询本机已有的仓库，不访问网络，也不 clone
+    # 未配置分支时查询工作区（包括未提交的修改）；配置了分支时，从 git 对象库读取匹配的本地分支
     def _get_projects_by_model_local(self):
-        pass
+        print("—————— 配置说明分割线（开始） ——————")
+        logging.info("—————— 配置说明分割线（开始） ——————")
+        msg = "本次处理的模式是：本地模式（local）"
+        logging.info(msg)
+        print(msg)
+        local_config = self.config['type_local']
+        repo_paths = [os.path.abspath(path) for path in local_config['paths'] or []]
+        if local_config['discover_root']:
+            repo_paths.extend(self._discover_local_repos(local_config['discover_root']))
+        # 去重，保持原有顺序
+        repo_paths = list(dict.fromkeys(repo_paths))
+        msg = f"本地仓库共{len(repo_paths)}个：{repo_paths}"
+        logging.info(msg)
+        print(msg)
+        if local_config['branches']:
+            msg = f"分支筛选条件是：本地分支名匹配正则表达式 {local_config['branches']}"
+        else:
+            msg = "分支筛选条件是：不筛选分支，查询工作区当前的文件"
+        logging.info(msg)
+        print(msg)
+        print("—————— 配置说明分割线（结束） ——————")
+        logging.info("—————— 配置说明分割线（结束） ——————")
+
+        if self.action == 'index_build':
+            msg = "本地模式不支持建立索引（索引需要从 gitlab 获取镜像）"
+            logging.info(msg)
+            print(msg)
+            return
 
-    # todo 拿到项目的目录list，依次在文件列表里进行匹配
+        # 获取每个仓库要处理的分支（工作区模式下分支为 None）
+        units = []
+        repos = [types.SimpleNamespace(id=repo_path, name=os.path.basename(repo_path.rstrip(os.sep)))
+                 for repo_path in repo_paths]
+        for repo in self._select_shard(repos):
+            repo_path = repo.id
+            try:
+                branches = self._get_local_branches(repo_path)
+            except Exception as e:
+                self.err_logger.error(f"本地仓库：{repo_path}，读取分支时出错：{e}")
+                continue
+            for branch in branches:
+                units.append((repo, branch))
+
+        # 测试模式下，只打印分支，不进行具体处理
+        if self.config['test_mode'] is True and self.config['test_only_show_branch'] is True:
+            for repo, branch in units:
+                msg = f"测试模式警告：test_mode 与 test_only_show_branch 为 true，因此不处理分支：{repo.name}-{branch or '工作区'}"
+                logging.info(msg)
+                print(msg)
+            return
+
+        self._deal_units(units, lambda unit: self._prepare_local_branch(unit[1], unit[0]))
+
+    # 在目录下查找所有 git 仓库（包含 .git 的目录），找到后不再进入仓库内部
+    def _discover_local_repos(self, root):
+        repo_paths = []
+        stack = [os.path.abspath(root)]
+        while stack:
+            path = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            if any(entry.name == '.git' for entry in entries):
+                repo_paths.append(path)
+                continue
+            # 倒序入栈，保证按名称顺序遍历
+            for entry in reversed(entries):
+                if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                    stack.append(entry.path)
+        return repo_paths
+
+    # 本地仓库中要处理的分支：未配置分支时返回 [None]（表示工作区），否则返回名称匹配的本地分支
+    def _get_local_branches(self, repo_path):
+        branch_patterns = self.config['type_local']['branches']
+        if not branch_patterns:
+            return [None]
+        git_repo = Repo(repo_path)
+        try:
+            branch_names = [head.name for head in git_repo.heads]
+        finally:
+            git_repo.close()
+        return [name for name in branch_names if any(re.search(pattern, name) for pattern in branch_patterns)]
+
+    # 准备本地仓库的分支（见 _prepare_branch）。不 clone，也不会删除任何文件
+    # 工作区：在工作区目录中查询；分支：从仓库的 git 对象库读取
+    def _prepare_local_branch(self, branch, repo):
+        unit = {
+            "repo": repo,
+            "branch": branch,
+            "scan_mode": 'checkout' if branch is None else 'object',
+            "path": None,
+            "files": [],
+            "commit": None,
+            "cleanup": None,
+            "error": None,
+        }
+        try:
+            git_repo = Repo(repo.id)
+            try:
+                if branch is None:
+                    unit['path'] = git_repo.working_tree_dir
+                    unit['branch'] = 'HEAD' if git_repo.head.is_detached else git_repo.active_branch.name
+                    unit['commit'] = self._get_commit_info(git_repo.head.commit)
+                else:
+                    unit['path'] = git_repo.git_dir
+            finally:
+                git_repo.close()
+
+            if branch is None:
+                # 工作区可能有未提交的修改，文件内容与 blob 对象ID 不一定一致，因此不使用缓存和增量查询
+                if self.config['file_list_source'] == 'index':
+                    unit['files'] = [(file_path, None) for file_path, blob_sha in
+                                     self.find_files_by_git_index(unit['path'])]
+                else:
+                    unit['files'] = [(file_path, None) for file_path in self.find_files_by_match_name(unit['path'])]
+            else:
+                self._read_branch_tree(unit)
+                if self.scan_state is not None:
+                    self._apply_scan_state(unit)
+        except Exception as e:
+            unit['error'] = f"本地仓库：{repo.id}，处理分支 {branch or '工作区'} 时出错：{e}"
+        return unit
+
+    # 分片执行：只处理第 index 个分片（从 0 开始，共 count 个）的项目，结果写入 log/shard_{index}_of_{count}
+    # 需要在 init() 之前调用
+    def set_shard(self, index, count):
+        if count < 1 or not 0 <= index < count:
+            print(f"分片参数错误：{index}/{count}，分片序号需要满足 0 <= 序号 < 分片总数")
+            exit()
+        self.shard = (index, count)
+        self.log_dir = self._shard_dir(index, count)
+        self.temp_dir = os.path.join('tempdir', f"shard_{index}_of_{count}")
+
+    def _shard_dir(self, index, count):
+        return os.path.join('log', f"shard_{index}_of_{count}")
+
+    # 合并分片结果：把各分片的结果合并为 log 目录下的 match.log、branch.log、err.log、match.xlsx 等
+    # 匹配结果按项目在完整项目列表中的顺序排列，与不分片执行时一致；branch.log、err.log 按分片顺序拼接
+    def merge_shards(self, count):
+        self._remove_oldfile()
+        self._set_log()
+        self._read_config()
+        self._open_sinks()
+        records = []
+        try:
+            for index in range(count):
+                shard_dir = self._shard_dir(index, count)
+                if not os.path.exists(os.path.join(shard_dir, 'shard.json')):
+                    msg = f"分片 {index}/{count} 未完成或不存在（{shard_dir}），合并结果不完整"
+                    print(msg)
+                    self.err_logger.error(msg)
+                for name, logger in [('branch.log', self.branch_logger), ('err.log', self.err_logger)]:
+                    if os.path.exists(os.path.join(shard_dir, name)):
+                        with open(os.path.join(shard_dir, name), encoding='utf-8') as file:
+                            for line in file:
+                                logger.info(line.rstrip('\n'))
+                if os.path.exists(os.path.join(shard_dir, 'units.jsonl')):
+                    # 中断后继续执行的分片，同一个分支可能有多条记录，使用最后一条
+                    latest = {}
+                    for record in UnitJournal.load(os.path.join(shard_dir, 'units.jsonl')):
+                        if record.get('type') == 'unit':
+                            latest[(record['project_id'], record['branch'])] = record
+                    records.extend(latest.values())
+            records.sort(key=lambda record: record['order'])
+            row_count = 0
+            for record in records:
+                for row in record['rows']:
+                    self._write_match_row(row)
+                    row_count += 1
+        finally:
+            self._close_sinks()
+        msg = f"合并完毕：{count}个分片，{len(records)}个分支，{row_count}条匹配结果"
+        logging.info(msg)
+        print(msg)
+        self._close_log()
 
     # 主执行程序
-    def run(self):
+    # 参数 action：search 查询（默认），index_build 建立 / 更新索引，index_query 使用索引查询
+    def run(self, action='search'):
+        self.action = action
         # 添加本次任务开始执行时间
         logging.info(f"本次任务开始执行时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
 
-        # 调用各自模式的函数去处理
-        if self.config['model'] == 'group':
-            self._search_by_model_group()
-        elif self.config['model'] == 'repository':
-            self._search_by_model_repository()
-        elif self.config['model'] == 'repositories':
-            self._get_projects_by_model_repositories()
-        elif self.config['model'] == 'local':
-            pass
-        else:
-            err_msg = "未选择任何一个合法模式，请检查配置文件"
-            print(err_msg)
-            self.err_logger.info(err_msg)
-            exit()
-        shutil.rmtree('tempdir', ignore_errors=True)
-        self.workbook.save('./log/match.xlsx')
+        # gitlab api 请求线程池
+        self.api_pool = ThreadPoolExecutor(max_workers=self.config['concurrency']['api_workers'])
+        try:
+            # 调用各自模式的函数去处理
+            if action == 'index_query':
+                # 使用索引查询，不需要访问 gitlab
+                self._query_index()
+            elif self.config['model'] == 'group':
+                self._search_by_model_group()
+            elif self.config['model'] == 'repository':
+                self._search_by_model_repository()
+            elif self.config['model'] == 'repositories':
+                self._get_projects_by_model_repositories()
+            elif self.config['model'] == 'local':
+                self._get_projects_by_model_local()
+            else:
+                err_msg = "未选择任何一个合法模式，请检查配置文件"
+                print(err_msg)
+                self.err_logger.info(err_msg)
+                exit()
+        finally:
+            self.api_pool.shutdown()
+            self.api_pool = None
+            # 出错中断时，已经产生的结果也会保存
+            self._close_sinks()
+        if self.metrics is not None:
+            self._report_metrics()
+            if self.config['metrics']['profile_slowest'] is True:
+                self._profile_slowest_branch()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        if self.journal is not None:
+            self.journal.close()
+        if self.shard is not None:
+            # 标记该分片已完成（合并时检查）
+            with open(os.path.join(self.log_dir, 'shard.json'), 'w', encoding='utf-8') as file:
+                json.dump({"shard": self.shard[0], "shards": self.shard[1],
+                           "finished_at": time.strftime('%Y-%m-%d %H:%M:%S')}, file)
+        if self.match_cache is not None:
+            msg = f"查询结果缓存：命中 {self.match_cache.hits} 次，未命中 {self.match_cache.misses} 次"
+            logging.info(msg)
+            print(msg)
+            self.match_cache.close()
         print("处理完毕")
+        self._close_log()
+
+
+# 查询进程中使用的 GitTool（每个进程一个，只用来执行查询）
+_worker_tool = None
+
+
+# 查询进程的入口：查询一批文件，返回 ([(文件相对路径, 查询结果)], 查询统计)
+def _search_files_in_worker(config, task):
+    global _worker_tool
+    if _worker_tool is None:
+        _worker_tool = GitTool()
+        _worker_tool.in_search_worker = True
+    _worker_tool.config = config
+    start = time.perf_counter()
+    bytes_read = _worker_tool.bytes_read
+    results = _worker_tool.search_files(task)
+    stats = {
+        "seconds": time.perf_counter() - start,
+        "files": len(task['files']),
+        "bytes_read": _worker_tool.bytes_read - bytes_read,
+    }
+    return results, stats
+
+
+# 建立索引的进程入口：读取一批 blob，返回 [(blob对象ID, 大小, trigram 集合)]
+def _extract_blob_trigrams(git_dir, blob_shas):
+    results = []
+    git_repo = Repo(git_dir)
+    try:
+        for blob_sha in blob_shas:
+            content = git_repo.odb.stream(hex_to_bin(blob_sha)).read()
+            results.append((blob_sha, len(content), extract_trigrams(content)))
+    finally:
+        git_repo.close()
+    return results
 
 
 if __name__ == '__main__':
     gt = GitTool()
-    # 删除历史文件
-    gt._remove_oldfile()
-    # 设置日志
-    gt._set_log()
-    # 启动 excel
-    gt._open_excel()
-    # 读取配置
-    gt._read_config()
+    # 初始化（与 main.py 相同，包括分支处理记录，中断后可以用 python main.py --resume 继续）
+    gt.init()
     # 启动程序
     gt.run()
 
@@ -0,0 +1,295 @@
+package main
+
+// 文件查询库，供 gittool.py 通过 ctypes 调用
+// 编译：go build -buildmode=c-shared -o lib/search.so lib/search.go
+//
+// 导出函数：
+//   searchStringInFileWrapper(filePath, searchString)  查询单个文件
+//   searchFilesBatchWrapper(root, filesJSON, optionsJSON)  批量查询多个文件（并行），一次调用返回所有结果
+//   freeCString(p)  释放上面两个函数返回的字符串（返回的字符串由 C.CString 分配，调用方必须释放）
+//   regexSearchSupported()  是否支持正则查询（批量查询的 Mode 为 regex）
+
+/*
+#include <stdlib.h>
+*/
+import "C"
+
+import (
+	"bytes"
+	"encoding/json"
+	"os"
+	"path/filepath"
+	"regexp"
+	"runtime"
+	"sort"
+	"sync"
+	"unsafe"
+)
+
+// 匹配成功的一行
+type MatchedLine struct {
+	LineNumber int    `json:"LineNumber"`
+	Line       string `json:"Line"`
+	Pattern    string `json:"Pattern,omitempty"`
+}
+
+// 单个文件的查询结果
+type SearchResult struct {
+	MatchedLines []MatchedLine `json:"MatchedLines"`
+	Error        *string       `json:"Error"`
+}
+
+// 批量查询中单个文件的结果，Index 为文件在入参列表中的下标
+type BatchResult struct {
+	Index        int           `json:"Index"`
+	MatchedLines []MatchedLine `json:"MatchedLines"`
+	Error        *string       `json:"Error"`
+}
+
+// 批量查询的选项
+type BatchOptions struct {
+	Patterns []string `json:"Patterns"`
+	Workers  int      `json:"Workers"`
+	// 查询模式：literal 按字符串查询（默认），regex 按正则查询
+	Mode string `json:"Mode"`
+	// 正则模式下，每个正则必须包含的字符串（由 gittool.py 从正则中提取）
+	Literals [][]string `json:"Literals"`
+}
+
+// 命中的一行：行首位置，命中的字符串（或正则）的下标
+type hit struct {
+	lineStart int
+	pattern   int
+}
+
+// 正则模式下的一个查询条件
+type regexPattern struct {
+	re       *regexp.Regexp
+	literals [][]byte
+	// 最长的必须包含的字符串，用来定位候选行（没有必须包含的字符串时为 nil，逐行执行正则）
+	anchor []byte
+}
+
+// 在文件内容中查询多个字符串，返回匹配成功的行（按行号排序，同一行按字符串顺序）
+func searchContent(content []byte, patterns []string) []MatchedLine {
+	var hits []hit
+	seen := map[[2]int]bool{}
+	for i, pattern := range patterns {
+		needle := []byte(pattern)
+		if len(needle) == 0 {
+			continue
+		}
+		offset := 0
+		for {
+			pos := bytes.Index(content[offset:], needle)
+			if pos < 0 {
+				break
+			}
+			pos += offset
+			lineStart := bytes.LastIndexByte(content[:pos], '\n') + 1
+			key := [2]int{lineStart, i}
+			if !seen[key] {
+				seen[key] = true
+				hits = append(hits, hit{lineStart, i})
+			}
+			// 同一行只记录一次，跳到下一行继续查找
+			lineEnd := bytes.IndexByte(content[pos:], '\n')
+			if lineEnd < 0 {
+				break
+			}
+			offset = pos + lineEnd + 1
+		}
+	}
+	return buildMatchedLines(content, hits, patterns)
+}
+
+// 编译正则，literals[i] 为第 i 个正则必须包含的字符串
+func compileRegexPatterns(patterns []string, literals [][]string) ([]regexPattern, error) {
+	result := make([]regexPattern, len(patterns))
+	for i, pattern := range patterns {
+		re, err := regexp.Compile(pattern)
+		if err != nil {
+			return nil, err
+		}
+		result[i].re = re
+		if i < len(literals) {
+			for _, literal := range literals[i] {
+				result[i].literals = append(result[i].literals, []byte(literal))
+				if len(literal) > len(result[i].anchor) {
+					result[i].anchor = []byte(literal)
+				}
+			}
+		}
+	}
+	return result, nil
+}
+
+// 正则模式：先在整个内容中查找正则必须包含的字符串，缺少任何一个则跳过该正则；
+// 再用最长的字符串定位候选行，只对包含所有必须包含的字符串的行执行完整的正则
+func searchContentRegex(content []byte, regexes []regexPattern, patterns []string) []MatchedLine {
+	var hits []hit
+	for i, p := range regexes {
+		if !containsAll(content, p.literals) {
+			continue
+		}
+		offset := 0
+		for offset <= len(content) {
+			lineStart := offset
+			if p.anchor != nil {
+				pos := bytes.Index(content[offset:], p.anchor)
+				if pos < 0 {
+					break
+				}
+				lineStart = bytes.LastIndexByte(content[:offset+pos], '\n') + 1
+			}
+			line := content[lineStart:]
+			offset = len(content) + 1
+			if end := bytes.IndexByte(line, '\n'); end >= 0 {
+				line = line[:end]
+				offset = lineStart + end + 1
+			}
+			line = bytes.TrimSuffix(line, []byte{'\r'})
+			if containsAll(line, p.literals) && p.re.Match(line) {
+				hits = append(hits, hit{lineStart, i})
+			}
+		}
+	}
+	return buildMatchedLines(content, hits, patterns)
+}
+
+func containsAll(content []byte, literals [][]byte) bool {
+	for _, literal := range literals {
+		if !bytes.Contains(content, literal) {
+			return false
+		}
+	}
+	return true
+}
+
+// 把命中的行整理成结果（按行号排序，同一行按字符串顺序），只有命中时才计算行号
+func buildMatchedLines(content []byte, hits []hit, patterns []string) []MatchedLine {
+	if len(hits) == 0 {
+		return []MatchedLine{}
+	}
+	sort.Slice(hits, func(a, b int) bool {
+		if hits[a].lineStart != hits[b].lineStart {
+			return hits[a].lineStart < hits[b].lineStart
+		}
+		return hits[a].pattern < hits[b].pattern
+	})
+
+	result := make([]MatchedLine, 0, len(hits))
+	lineNumber := 1
+	lastLineStart := 0
+	for _, h := range hits {
+		lineNumber += bytes.Count(content[lastLineStart:h.lineStart], []byte{'\n'})
+		lastLineStart = h.lineStart
+		line := content[h.lineStart:]
+		if end := bytes.IndexByte(line, '\n'); end >= 0 {
+			line = line[:end]
+		}
+		line = bytes.TrimSuffix(line, []byte{'\r'})
+		result = append(result, MatchedLine{LineNumber: lineNumber, Line: string(line), Pattern: patterns[h.pattern]})
+	}
+	return result
+}
+
+func searchFile(filePath string, search func([]byte) []MatchedLine) ([]MatchedLine, *string) {
+	content, err := os.ReadFile(filePath)
+	if err != nil {
+		msg := "读取文件时发生错误：" + err.Error()
+		return nil, &msg
+	}
+	return search(content), nil
+}
+
+func toCString(v interface{}) *C.char {
+	data, _ := json.Marshal(v)
+	return C.CString(string(data))
+}
+
+//export searchStringInFileWrapper
+func searchStringInFileWrapper(filePath *C.char, searchString *C.char) *C.char {
+	patterns := []string{C.GoString(searchString)}
+	matchedLines, err := searchFile(C.GoString(filePath), func(content []byte) []MatchedLine {
+		return searchContent(content, patterns)
+	})
+	if matchedLines == nil {
+		matchedLines = []MatchedLine{}
+	}
+	return toCString(SearchResult{MatchedLines: matchedLines, Error: err})
+}
+
+//export searchFilesBatchWrapper
+func searchFilesBatchWrapper(root *C.char, filesJSON *C.char, optionsJSON *C.char) *C.char {
+	rootPath := C.GoString(root)
+	var files []string
+	var options BatchOptions
+	if err := json.Unmarshal([]byte(C.GoString(filesJSON)), &files); err != nil {
+		msg := "文件列表解析失败：" + err.Error()
+		return toCString([]BatchResult{{Index: -1, Error: &msg}})
+	}
+	if err := json.Unmarshal([]byte(C.GoString(optionsJSON)), &options); err != nil {
+		msg := "查询选项解析失败：" + err.Error()
+		return toCString([]BatchResult{{Index: -1, Error: &msg}})
+	}
+	search := func(content []byte) []MatchedLine {
+		return searchContent(content, options.Patterns)
+	}
+	if options.Mode == "regex" {
+		regexes, err := compileRegexPatterns(options.Patterns, options.Literals)
+		if err != nil {
+			msg := "正则编译失败：" + err.Error()
+			return toCString([]BatchResult{{Index: -1, Error: &msg}})
+		}
+		search = func(content []byte) []MatchedLine {
+			return searchContentRegex(content, regexes, options.Patterns)
+		}
+	}
+	workers := options.Workers
+	if workers <= 0 {
+		workers = runtime.NumCPU()
+	}
+
+	// 多个 goroutine 并行查询，只返回有匹配或有报错的文件
+	results := make([]*BatchResult, len(files))
+	indexes := make(chan int)
+	var wg sync.WaitGroup
+	for w := 0; w < workers; w++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range indexes {
+				matchedLines, err := searchFile(filepath.Join(rootPath, files[i]), search)
+				if err != nil || len(matchedLines) > 0 {
+					results[i] = &BatchResult{Index: i, MatchedLines: matchedLines, Error: err}
+				}
+			}
+		}()
+	}
+	for i := range files {
+		indexes <- i
+	}
+	close(indexes)
+	wg.Wait()
+
+	compact := make([]BatchResult, 0)
+	for _, r := range results {
+		if r != nil {
+			compact = append(compact, *r)
+		}
+	}
+	return toCString(compact)
+}
+
+//export regexSearchSupported
+func regexSearchSupported() C.int {
+	return 1
+}
+
+//export freeCString
+func freeCString(p *C.char) {
+	C.free(unsafe.Pointer(p))
+}
+
+func main() {}
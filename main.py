@@ -1,7 +1,40 @@
+import argparse
 from gittool import GitTool
 
-gt = GitTool()
-# 先初始化
-gt.init()
-# 启动程序
-gt.run()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在 gitlab 的多个仓库、多个分支中搜索指定字符串')
+    parser.add_argument('--cache-info', action='store_true', help='查看查询结果缓存')
+    parser.add_argument('--cache-clear', action='store_true', help='清空查询结果缓存')
+    parser.add_argument('--index-build', action='store_true', help='建立 / 增量更新 trigram 索引（按配置选择项目和分支）')
+    parser.add_argument('--index-query', action='store_true', help='使用 trigram 索引查询，不访问 gitlab')
+    parser.add_argument('--shard', help='分片执行：i/N 表示只处理第 i 个分片（从 0 开始，共 N 个）的项目，结果写入 log/shard_i_of_N')
+    parser.add_argument('--resume', action='store_true',
+                        help='继续上次中断的查询：上次已完成且最新提交没变的分支直接使用上次的结果，不再 clone 和查询')
+    parser.add_argument('--merge-shards', type=int, metavar='N', help='合并 N 个分片的结果到 log 目录')
+    args = parser.parse_args()
+
+    gt = GitTool()
+    if args.cache_info or args.cache_clear:
+        # 只处理缓存，不执行查询
+        gt.manage_match_cache(clear=args.cache_clear)
+    elif args.merge_shards:
+        # 只合并分片结果，不执行查询
+        gt.merge_shards(args.merge_shards)
+    else:
+        if args.shard:
+            if args.index_build or args.index_query:
+                parser.error('--shard 不能与 --index-build、--index-query 同时使用')
+            try:
+                shard_index, shard_count = (int(value) for value in args.shard.split('/'))
+            except ValueError:
+                parser.error('--shard 格式为 i/N，例如 0/4')
+            gt.set_shard(shard_index, shard_count)
+        # 先初始化
+        gt.init(resume=args.resume)
+        # 启动程序
+        if args.index_build:
+            gt.run(action='index_build')
+        elif args.index_query:
+            gt.run(action='index_query')
+        else:
+            gt.run()
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+
+# 查询结果缓存
+# 以 (blob 对象ID, 搜索字符串, 搜索选项) 为键，保存该文件的 MatchedLines
+# blob 对象ID 由文件内容决定，因此缓存可以在分支、项目、多次运行之间共用
+# 使用 sqlite 持久化，超过条数上限时按最近使用时间淘汰（LRU）
+class MatchCache:
+    # 每写入多少次提交一次事务
+    COMMIT_INTERVAL = 1000
+
+    def __init__(self, path, max_entries=1000000):
+        self.path = path
+        self.max_entries = max_entries
+        # 本次运行的命中情况
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS match_cache ("
+            "key TEXT PRIMARY KEY, matched_lines TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_match_cache_last_used ON match_cache(last_used)")
+        self.conn.commit()
+
+    # 生成缓存键
+    @staticmethod
+    def make_key(blob_sha, search_string, options):
+        raw = json.dumps([blob_sha, search_string, options], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    # 读取缓存，未命中返回 None
+    def get(self, key):
+        row = self.conn.execute("SELECT matched_lines FROM match_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # 更新最近使用时间
+        self.conn.execute("UPDATE match_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._after_write()
+        return json.loads(row[0])
+
+    # 写入缓存
+    def put(self, key, matched_lines):
+        self.conn.execute("INSERT OR REPLACE INTO match_cache (key, matched_lines, last_used) VALUES (?, ?, ?)",
+                          (key, json.dumps(matched_lines, ensure_ascii=False), time.time()))
+        self._after_write()
+
+    def _after_write(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_INTERVAL:
+            self.evict()
+            self.conn.commit()
+            self._pending = 0
+
+    # 超过条数上限时，删除最久未使用的条目
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM match_cache").fetchone()[0]
+        if count <= self.max_entries:
+            return 0
+        over = count - self.max_entries
+        self.conn.execute("DELETE FROM match_cache WHERE key IN "
+                          "(SELECT key FROM match_cache ORDER BY last_used LIMIT ?)", (over,))
+        return over
+
+    # 缓存统计信息
+    def stats(self):
+        self.conn.commit()
+        count = self.conn.execute("SELECT COUNT(*) FROM match_cache").fetchone()[0]
+        return {
+            "path": self.path,
+            "entries": count,
+            "max_entries": self.max_entries,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # 清空缓存
+    def clear(self):
+        self.conn.execute("DELETE FROM match_cache")
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
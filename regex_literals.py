@@ -0,0 +1,48 @@
+import re
+
+try:
+    # python 3.11 起 sre_parse 移到了 re._parser
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+# 提取正则中必须包含的字符串：能匹配该正则的内容，一定包含返回的每一个字符串
+# 查询时先用这些字符串快速过滤文件和行，只对包含它们的行执行完整的正则
+# 例如 fetch\(['"]/api/v[12]/orders 返回 ['fetch(', '/api/v', '/orders']
+# 忽略大小写的正则，以及没有固定字符串的正则（比如 \d+），返回空列表（不过滤）
+def required_literals(pattern):
+    parsed = sre_parse.parse(pattern)
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    if state.flags & re.IGNORECASE:
+        return []
+    literals = []
+    _collect(parsed, literals)
+    return list(dict.fromkeys(literal for literal in literals if literal != ''))
+
+
+# 遍历解析后的正则，连续的普通字符拼成一个字符串
+# 只有一定会出现的部分才继续往下找（分组、至少重复一次的部分），分支、可选部分、字符集等会打断连续的字符串
+def _collect(items, literals):
+    run = []
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        literals.append(''.join(run))
+        run = []
+        if op is sre_parse.SUBPATTERN:
+            group, add_flags, del_flags, sub = av
+            if not add_flags & re.IGNORECASE:
+                _collect(sub, literals)
+        elif op in _REPEATS:
+            min_count, max_count, sub = av
+            if min_count >= 1:
+                _collect(sub, literals)
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            _collect(av, literals)
+    literals.append(''.join(run))
+
+
+_REPEATS = tuple(getattr(sre_parse, name) for name in ['MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT']
+                 if hasattr(sre_parse, name))
@@ -0,0 +1,89 @@
+import os
+import csv
+import json
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+
+# 匹配结果输出：结果产生时立即写入磁盘，内存占用与匹配条数无关
+# 每条结果是一个列表，顺序与 HEADER 一致
+HEADER = ["仓库名", "分支名", "文件路径", "文件行数", "匹配字符串", "该行内容"]
+JSON_KEYS = ["project", "branch", "file", "line_number", "pattern", "line"]
+
+
+# Excel 输出（openpyxl 只写模式，行数据流式写入临时文件，保存时再打包）
+# 超过单个工作表的行数上限时，自动新建工作表
+class ExcelSink:
+    # Excel 单个工作表最多 1048576 行（包含表头）
+    MAX_ROWS = 1048576
+
+    def __init__(self, path, title="匹配结果"):
+        self.path = path
+        self.title = title
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = None
+        self.sheet_count = 0
+        self.row_count = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        title = self.title if self.sheet_count == 1 else f"{self.title}{self.sheet_count}"
+        self.worksheet = self.workbook.create_sheet(title)
+        self.worksheet.append(HEADER)
+        self.row_count = 1
+
+    def write(self, row):
+        if self.row_count >= self.MAX_ROWS:
+            self._new_sheet()
+        # Excel 不支持控制字符，写入前移除
+        self.worksheet.append([ILLEGAL_CHARACTERS_RE.sub('', v) if isinstance(v, str) else v for v in row])
+        self.row_count += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+# CSV 输出（带 BOM，Excel 可直接打开）
+class CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(HEADER)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+# JSONL 输出（每行一个 json 对象）
+class JsonlSink:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, row):
+        self.file.write(json.dumps(dict(zip(JSON_KEYS, row)), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+SINK_CLASSES = {
+    "xlsx": ExcelSink,
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+}
+
+
+# 根据输出格式列表创建输出，文件名为 match.<格式>
+def open_sinks(formats, log_dir):
+    sinks = []
+    for output_format in formats:
+        if output_format not in SINK_CLASSES:
+            raise ValueError(f"不支持的输出格式：{output_format}，只能是 {list(SINK_CLASSES)}")
+        sinks.append(SINK_CLASSES[output_format](os.path.join(log_dir, f"match.{output_format}")))
+    return sinks
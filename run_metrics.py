@@ -0,0 +1,97 @@
+import os
+import re
+import json
+import time
+import threading
+import contextlib
+
+
+# 运行统计：各阶段耗时、gitlab api 请求数、每个分支的耗时和数据量
+# 每个分支处理完后写入一行 json（type=branch），运行结束时写入汇总（type=summary）
+# 各阶段耗时为所有线程 / 进程的累计值，并发执行时可能大于总耗时
+class RunMetrics:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        # 阶段 -> {"seconds": 累计耗时, "count": 次数}
+        self.phases = {}
+        # 接口（方法 + 路径模板） -> {"count": 次数, "seconds": 累计耗时}
+        self.api_requests = {}
+        # 计数器（更新镜像的数据量等）
+        self.counters = {}
+        # 所有分支的统计
+        self.branches = []
+
+    # 统计一个阶段的耗时。record 不为 None 时，同时累加到该分支的统计中（{阶段}_seconds）
+    @contextlib.contextmanager
+    def phase(self, name, record=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.add_phase(name, seconds)
+            if record is not None:
+                with self.lock:
+                    record[f"{name}_seconds"] = record.get(f"{name}_seconds", 0) + seconds
+
+    def add_phase(self, name, seconds, count=1):
+        with self.lock:
+            phase = self.phases.setdefault(name, {"seconds": 0, "count": 0})
+            phase['seconds'] += seconds
+            phase['count'] += count
+
+    def add_counter(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # 记录一次 gitlab api 请求，路径中的项目、群组ID替换为 :id 后汇总
+    def add_api_request(self, method, path, seconds):
+        route = re.sub(r'/(projects|groups)/[^/]+', r'/\1/:id', path.split('?', 1)[0])
+        key = f"{method} {route}"
+        with self.lock:
+            api = self.api_requests.setdefault(key, {"count": 0, "seconds": 0})
+            api['count'] += 1
+            api['seconds'] += seconds
+
+    # 记录一个分支的统计（只在主线程调用）
+    def add_branch(self, record):
+        self.branches.append(record)
+        self.file.write(json.dumps(dict(record, type='branch'), ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def summary(self):
+        totals = {}
+        for key in ['files', 'files_searched', 'files_skipped', 'bytes_read', 'matches', 'clone_bytes']:
+            totals[key] = sum(record.get(key, 0) for record in self.branches)
+        return {
+            "type": 'summary',
+            "elapsed_seconds": time.perf_counter() - self.start,
+            "branches": len(self.branches),
+            "branch_errors": sum(1 for record in self.branches if record.get('error')),
+            "totals": totals,
+            "counters": self.counters,
+            "phases": self.phases,
+            "api_requests": self.api_requests,
+            "api_request_count": sum(api['count'] for api in self.api_requests.values()),
+        }
+
+    # 写入汇总并关闭文件，返回汇总
+    def close(self):
+        summary = self.summary()
+        self.file.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        self.file.close()
+        return summary
+
+
+# 目录占用的字节数（不跟随软链接）
+def dir_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                size += os.path.getsize(file_path)
+    return size
@@ -0,0 +1,50 @@
+import os
+import json
+import hashlib
+import urllib.parse
+
+
+# 增量查询的扫描记录
+# 每个 项目+分支 一个 json 文件：{path}/{项目ID}/{分支名}.json，记录上次扫描的提交ID和查询结果
+# {
+#     "key": 被搜索的字符串、搜索选项、文件匹配规则的摘要（任意一项变化后，记录失效，重新全量查询）,
+#     "commit": 上次扫描的分支最新提交ID,
+#     "results": {文件相对路径: MatchedLines}（只记录有匹配的文件）,
+#     "errors": [查询出错的文件相对路径]（下次重新查询）,
+#     "skipped": {文件相对路径: 跳过原因}（文件分流跳过的文件，沿用时保留跳过原因）
+# }
+# 不同分支写不同的文件，因此多个线程可以同时读写不同分支的记录
+class ScanState:
+    def __init__(self, path):
+        self.path = path
+
+    # 记录的键：被搜索的字符串、搜索选项、文件匹配规则
+    @staticmethod
+    def make_key(search_string, options, file_match):
+        raw = json.dumps([search_string, options, file_match], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _file_path(self, project_id, branch):
+        # 分支名可能包含 / 等字符，编码后作为文件名
+        return os.path.join(self.path, str(project_id), urllib.parse.quote(branch, safe='') + '.json')
+
+    # 读取上次的扫描记录，不存在或已损坏时返回 None
+    def load(self, project_id, branch):
+        file_path = self._file_path(project_id, branch)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    # 保存本次的扫描记录（先写临时文件再替换，避免中断后留下不完整的记录）
+    def save(self, project_id, branch, key, commit, results, errors, skipped=None):
+        file_path = self._file_path(project_id, branch)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({"key": key, "commit": commit, "results": results, "errors": errors, "skipped": skipped or {}},
+                      file, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
@@ -0,0 +1,181 @@
+import os
+import sys
+import logging
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gittool import GitTool
+from match_cache import MatchCache
+from scan_state import ScanState
+
+
+# 记录提交的查询任务（不实际执行）
+class RecordingPool:
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, func, config, task):
+        self.tasks.append(task)
+        raise AssertionError(f"不应该提交查询任务：{task['files']}")
+
+
+# 在当前进程中直接执行查询任务
+class InlinePool:
+    def submit(self, func, config, task):
+        future = Future()
+        future.set_result(func(config, task))
+        return future
+
+
+class TestRunDedupe(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.gt = GitTool()
+        self.gt.config = {
+            "search_patterns": ['/api/v1/orders'],
+            "search_mode": 'literal',
+            "file_search_engine": 'python',
+            "scan_mode": 'object',
+            "dedupe": {"enable": True},
+            "triage": {"enable": False, "max_file_size": 0, "sniff_bytes": 8192, "gitattributes": False},
+            "log": {"trace_files": False, "progress_interval": 1000},
+        }
+        self.gt.match_logger = logging.getLogger('test_match')
+        self.gt.branch_logger = logging.getLogger('test_branch')
+        self.gt.err_logger = logging.getLogger('test_err')
+        self.gt.match_cache = MatchCache(os.path.join(self.tmp.name, 'cache.db'))
+        # 主进程中不应该查询文件
+        self.main_process_searches = []
+        self.gt.search_files = lambda task: self.main_process_searches.append(task) or []
+
+    def tearDown(self):
+        self.gt.match_cache.close()
+        self.tmp.cleanup()
+
+    def _unit(self, branch, files):
+        return {
+            "repo": type('Repo', (), {"id": 1, "name": 'alpha'})(),
+            "branch": branch,
+            "scan_mode": 'object',
+            "path": self.tmp.name,
+            "files": files,
+            "commit": {"hexsha": branch * 10, "committed_date": 0, "author": 'a'},
+            "cleanup": None,
+            "error": None,
+            "metrics": {},
+        }
+
+    # 缓存已有全部结果时，多个分支共享的 blob 不应该在主进程或进程池中重新查询
+    def test_warm_cache_does_no_searching(self):
+        hit = [{"LineNumber": 1, "Line": 'fetch("/api/v1/orders")', "Pattern": '/api/v1/orders'}]
+        for blob_sha, matched_lines in [('a' * 40, hit), ('b' * 40, [])]:
+            key = MatchCache.make_key(blob_sha, self.gt.config['search_patterns'], self.gt._search_options())
+            self.gt.match_cache.put(key, matched_lines)
+
+        pool = RecordingPool()
+        units = [self._unit(branch, [('src/a.js', 'a' * 40), ('src/b.js', 'b' * 40)]) for branch in ['main', 'dev']]
+        for unit in units:
+            self.gt._submit_search(unit, pool)
+        for unit in units:
+            self.gt._deal_branch_result(unit)
+
+        self.assertEqual(pool.tasks, [])
+        self.assertEqual(self.main_process_searches, [])
+        self.assertEqual(self.gt.run_pending, set())
+        self.assertEqual([unit['metrics']['error'] for unit in units], [None, None])
+        self.assertEqual([unit['metrics']['matches'] for unit in units], [1, 1])
+        # 第二个分支的文件直接使用第一个分支的结果
+        self.assertEqual(units[1]['metrics']['files_deduped'], 2)
+
+    # 记录的 blob 查询结果达到上限后，不再记录新的结果
+    def test_run_results_are_capped(self):
+        for blob_sha in ['a' * 40, 'b' * 40]:
+            key = MatchCache.make_key(blob_sha, self.gt.config['search_patterns'], self.gt._search_options())
+            self.gt.match_cache.put(key, [])
+        self.gt.RUN_RESULTS_MAX_BLOBS = 1
+
+        unit = self._unit('main', [('src/a.js', 'a' * 40), ('src/b.js', 'b' * 40)])
+        self.gt._submit_search(unit, RecordingPool())
+        self.gt._deal_branch_result(unit)
+
+        self.assertEqual(list(self.gt.run_results), ['a' * 40])
+        self.assertEqual(self.main_process_searches, [])
+
+    # 最新提交相同的分支中，第一个分支处理失败时，之后的分支重新查询，而不是记为出错
+    def test_shared_branch_falls_back_when_first_branch_fails(self):
+        self.gt.config['concurrency'] = {"io_workers": 2, "search_workers": 1}
+        repo = type('Repo', (), {"id": 1, "name": 'alpha'})()
+        for branch in ['main', 'dev', 'test']:
+            self.gt.branch_tips[(repo.id, branch)] = 'c' * 40
+        prepared = []
+
+        def prepare(source):
+            branch = source[1]
+            prepared.append(branch)
+            unit = self._unit(branch, [])
+            if branch == 'main':
+                unit['error'] = f"项目：alpha，处理分支 {branch} 时出错：clone 失败"
+            return unit
+
+        units = [(repo, 'main'), (repo, 'dev'), (repo, 'test')]
+        records = []
+        self.gt._record_branch_metrics = lambda unit, record: records.append(record)
+        self.gt._deal_units(units, prepare)
+
+        self.assertEqual(prepared, ['main', 'dev'])
+        self.assertEqual([record['branch'] for record in records], ['main', 'dev', 'test'])
+        self.assertIsNotNone(records[0]['error'])
+        self.assertIsNone(records[1]['error'])
+        self.assertNotIn('shared_with', records[1])
+        self.assertIsNone(records[2]['error'])
+        self.assertEqual(records[2]['shared_with'], 'alpha-dev')
+
+    # 文件分流跳过的文件不写入查询结果缓存，第二次运行时仍按原因计数；扫描记录中保留跳过原因
+    def test_skipped_files_keep_reason_across_runs(self):
+        files = {'src/a.js': b'fetch("/api/v1/orders")\n', 'src/b.js': b'\0\1\2', 'src/c.js': b'caf\xe9 /api/v1/orders\n'}
+        for file_path, content in files.items():
+            os.makedirs(os.path.join(self.tmp.name, 'src'), exist_ok=True)
+            with open(os.path.join(self.tmp.name, file_path), 'wb') as file:
+                file.write(content)
+        self.gt.config['scan_mode'] = 'checkout'
+        self.gt.config['triage']['enable'] = True
+        self.gt.config['concurrency'] = {"search_workers": 1}
+        self.gt.scan_state = ScanState(os.path.join(self.tmp.name, 'state'))
+        blobs = [(file_path, chr(ord('a') + i) * 40) for i, file_path in enumerate(files)]
+
+        records = []
+        for run in range(2):
+            unit = self._unit('main', blobs)
+            unit['scan_mode'] = 'checkout'
+            unit['scan_state_key'] = 'key'
+            self.gt.run_results = {}
+            self.gt._submit_search(unit, InlinePool())
+            self.gt._deal_branch_result(unit)
+            records.append(unit['metrics'])
+
+        self.assertEqual(records[0]['skipped'], {"binary": 1, "non_utf8": 1})
+        self.assertEqual(records[1]['skipped'], {"binary": 1, "non_utf8": 1})
+        self.assertEqual([record['matches'] for record in records], [1, 1])
+        # 第二次运行时，只有没被跳过的文件命中缓存
+        self.assertEqual(records[1]['files_searched'], 2)
+        state = self.gt.scan_state.load(1, 'main')
+        self.assertEqual(state['skipped'], {"src/b.js": 'binary', "src/c.js": 'non_utf8'})
+
+    # 不同查询引擎的结果不共用缓存（对象库模式中 go 引擎实际使用 python 引擎，可以共用）
+    def test_cache_key_depends_on_engine(self):
+        def key(scan_mode, engine):
+            self.gt.config['scan_mode'] = scan_mode
+            self.gt.config['file_search_engine'] = engine
+            return MatchCache.make_key('a' * 40, self.gt.config['search_patterns'], self.gt._search_options())
+
+        self.assertNotEqual(key('checkout', 'python'), key('checkout', 'mmap'))
+        self.assertNotEqual(key('checkout', 'python'), key('checkout', 'go'))
+        self.assertNotEqual(key('object', 'python'), key('object', 'mmap'))
+        self.assertEqual(key('object', 'python'), key('object', 'go'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+
+
+# 三元组（trigram）倒排索引
+# 记录每个文件内容（以 blob 对象ID 区分）包含哪些 3 字节片段，查询时先用索引缩小候选文件范围，再用查询引擎确认
+# 索引按 blob 对象ID 去重，内容没变的文件不会重复建立索引；分支最新提交没变时整个分支跳过，因此可以增量更新
+#
+# 表结构：
+#   blobs     已建立索引的文件内容
+#   postings  trigram -> blob 的倒排表
+#   refs      已建立索引的 项目+分支，以及对应的提交、镜像目录
+#   files     项目+分支 下的文件路径 -> blob
+class TrigramIndex:
+    def __init__(self, path):
+        self.path = path
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                id INTEGER PRIMARY KEY, sha TEXT UNIQUE NOT NULL, size INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS postings (
+                trigram BLOB NOT NULL, blob_id INTEGER NOT NULL, PRIMARY KEY (trigram, blob_id)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS refs (
+                project_id TEXT NOT NULL, project_name TEXT NOT NULL, branch TEXT NOT NULL,
+                commit_sha TEXT NOT NULL, committed_date INTEGER NOT NULL, author TEXT NOT NULL,
+                git_dir TEXT NOT NULL, ord INTEGER NOT NULL, PRIMARY KEY (project_id, branch));
+            CREATE TABLE IF NOT EXISTS files (
+                project_id TEXT NOT NULL, branch TEXT NOT NULL, ord INTEGER NOT NULL, path TEXT NOT NULL,
+                blob_sha TEXT NOT NULL, PRIMARY KEY (project_id, branch, path));
+            CREATE INDEX IF NOT EXISTS idx_files_blob_sha ON files(blob_sha);
+        """)
+        self.conn.commit()
+
+    # 已建立索引的分支最新提交ID，没有则返回 None
+    def get_ref_commit(self, project_id, branch):
+        row = self.conn.execute("SELECT commit_sha FROM refs WHERE project_id = ? AND branch = ?",
+                                (str(project_id), branch)).fetchone()
+        return row[0] if row else None
+
+    # 更新分支的排序（分支最新提交没变、跳过重建时使用）
+    def touch_ref(self, project_id, branch, ord):
+        self.conn.execute("UPDATE refs SET ord = ? WHERE project_id = ? AND branch = ?", (ord, str(project_id), branch))
+
+    # 记录分支的提交信息和文件列表（files 为 [(文件相对路径, blob对象ID)]），覆盖旧的记录
+    def update_ref(self, project_id, project_name, branch, commit, git_dir, files, ord):
+        project_id = str(project_id)
+        self.conn.execute("DELETE FROM files WHERE project_id = ? AND branch = ?", (project_id, branch))
+        self.conn.execute("INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                          (project_id, project_name, branch, commit['hexsha'], commit['committed_date'],
+                           commit['author'], git_dir, ord))
+        self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                              [(project_id, branch, i, path, sha) for i, (path, sha) in enumerate(files)])
+
+    # 删除某个项目下不在 branches 中的分支（分支已删除或不再被选中）
+    def remove_other_refs(self, project_id, branches):
+        project_id = str(project_id)
+        rows = self.conn.execute("SELECT branch FROM refs WHERE project_id = ?", (project_id,)).fetchall()
+        for (branch,) in rows:
+            if branch not in branches:
+                self.conn.execute("DELETE FROM refs WHERE project_id = ? AND branch = ?", (project_id, branch))
+                self.conn.execute("DELETE FROM files WHERE project_id = ? AND branch = ?", (project_id, branch))
+
+    # 返回还没有建立索引的 blob 对象ID
+    def missing_blobs(self, shas):
+        missing = []
+        for sha in dict.fromkeys(shas):
+            if self.conn.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone() is None:
+                missing.append(sha)
+        return missing
+
+    # 为一个文件内容建立索引
+    def add_blob(self, sha, size, trigrams):
+        cursor = self.conn.execute("INSERT OR IGNORE INTO blobs (sha, size) VALUES (?, ?)", (sha, size))
+        if cursor.rowcount == 0:
+            return
+        blob_id = cursor.lastrowid
+        self.conn.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                              [(trigram, blob_id) for trigram in trigrams])
+
+    # 删除已经没有任何分支引用的文件内容
+    def prune(self):
+        rows = self.conn.execute(
+            "SELECT id FROM blobs WHERE sha NOT IN (SELECT DISTINCT blob_sha FROM files)").fetchall()
+        for (blob_id,) in rows:
+            self.conn.execute("DELETE FROM postings WHERE blob_id = ?", (blob_id,))
+            self.conn.execute("DELETE FROM blobs WHERE id = ?", (blob_id,))
+        return len(rows)
+
+    # 根据被搜索的字符串（bytes 列表）找出可能包含其中任意一个的 blob 对象ID
+    # 某个字符串不足 3 个字节时无法使用索引，返回 None 表示所有文件都是候选
+    def candidates(self, needles):
+        result = set()
+        for needle in needles:
+            trigrams = extract_trigrams(needle)
+            if not trigrams:
+                return None
+            blob_ids = None
+            for trigram in trigrams:
+                rows = self.conn.execute("SELECT blob_id FROM postings WHERE trigram = ?", (trigram,)).fetchall()
+                ids = {row[0] for row in rows}
+                blob_ids = ids if blob_ids is None else blob_ids & ids
+                if not blob_ids:
+                    break
+            result |= blob_ids
+        if not result:
+            return set()
+        placeholders = ','.join('?' * len(result))
+        rows = self.conn.execute(f"SELECT sha FROM blobs WHERE id IN ({placeholders})", list(result)).fetchall()
+        return {row[0] for row in rows}
+
+    # 所有已建立索引的分支（按建立索引时的顺序）
+    def refs(self):
+        rows = self.conn.execute("SELECT project_id, project_name, branch, commit_sha, committed_date, author, git_dir "
+                                 "FROM refs ORDER BY ord, project_name, branch").fetchall()
+        return [{
+            "project_id": row[0],
+            "project_name": row[1],
+            "branch": row[2],
+            "commit": {"hexsha": row[3], "committed_date": row[4], "author": row[5]},
+            "git_dir": row[6],
+        } for row in rows]
+
+    # 分支下的文件（按原始顺序），blob_shas 不为 None 时只返回内容在其中的文件
+    def ref_files(self, project_id, branch, blob_shas=None):
+        rows = self.conn.execute("SELECT path, blob_sha FROM files WHERE project_id = ? AND branch = ? ORDER BY ord",
+                                 (str(project_id), branch)).fetchall()
+        return [(path, sha) for path, sha in rows if blob_shas is None or sha in blob_shas]
+
+    # 索引统计信息
+    def stats(self):
+        return {
+            "refs": self.conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0],
+            "files": self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+            "blobs": self.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0],
+        }
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+# 提取内容中所有不重复的 3 字节片段
+def extract_trigrams(content):
+    return {content[i:i + 3] for i in range(len(content) - 2)}
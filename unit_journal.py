@@ -0,0 +1,51 @@
+import os
+import json
+
+
+# 分支处理记录（units.jsonl）：每处理完一个分支追加一行 json，写入后立即落盘，中断后可以继续（--resume）
+# 第一行为本次查询的信息：{"type": "run", "key": 被搜索的字符串、搜索选项、文件匹配规则的摘要}
+# 之后每行一个分支：
+# {
+#     "type": "unit",
+#     "order": [项目在完整项目列表中的序号, 分支在项目中的序号]（合并分片结果时按此排序）,
+#     "project_id": 项目ID, "project": 项目名, "branch": 分支名,
+#     "tip": 分支列表中的最新提交ID（继续查询时，最新提交没变的分支才跳过）,
+#     "commit": 分支最新提交信息（出错时为 null）,
+#     "error": 分支出错信息（没有出错为 null）,
+#     "files": 文件数,
+#     "rows": 匹配结果（每条与 match.xlsx 的一行相同）,
+#     "file_errors": 查询出错的文件信息（与 err.log 中的相同）
+# }
+class UnitJournal:
+    # append 为 True 时在原有记录后继续追加（先去掉中断时没写完的最后一行）
+    def __init__(self, path, append=False):
+        self.path = path
+        if append:
+            self._truncate_partial_line()
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def _truncate_partial_line(self):
+        with open(self.path, 'rb+') as file:
+            content = file.read()
+            if content and not content.endswith(b'\n'):
+                file.truncate(content.rfind(b'\n') + 1)
+
+    def append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    # 读取所有记录。中断时最后一行可能不完整，忽略
+    @staticmethod
+    def load(path):
+        records = []
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records